@@ -1,933 +1,3967 @@
-import os
-import sys
-import re
-from docx import Document
-from docx.shared import Cm, Pt
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-
-# Словарь для преобразования номеров месяцев в названия
-MONTH_NAMES = {
-    '1': 'января', '01': 'января',
-    '2': 'февраля', '02': 'февраля',
-    '3': 'марта', '03': 'марта',
-    '4': 'апреля', '04': 'апреля',
-    '5': 'мая', '05': 'мая',
-    '6': 'июня', '06': 'июня',
-    '7': 'июля', '07': 'июля',
-    '8': 'августа', '08': 'августа',
-    '9': 'сентября', '09': 'сентября',
-    '10': 'октября',
-    '11': 'ноября',
-    '12': 'декабря'
-}
-
-
-def is_part_of_document_number(context):
-    """
-    Проверяет, является ли число частью составного номера (например, № А3233 344/2 025)
-    """
-    # Паттерны, указывающие на начало номера
-    patterns = [
-        r'№\s*[\w-]*\d',  # №, за которым следует буква/цифра (например, № А3233)
-        r'\b[А-Я]{1,2}\d{3,}',  # Буква + 3+ цифры (например, А3233)
-        r'\d{3,}[/-]\d',  # Много цифр + / или - (например, 344/2)
-        r'\b\d{3,}\s*\d{2,4}\b'  # Пробел между группами цифр (например, 344 025)
-    ]
-    context_lower = context.lower()
-    for pattern in patterns:
-        if re.search(pattern, context_lower):
-            return True
-    return False
-
-
-def set_justify_alignment(doc):
-    """
-    Устанавливает выравнивание текста по ширине во всем документе.
-    """
-    try:
-        # Обрабатываем параграфы в основном документе
-        for paragraph in doc.paragraphs:
-            paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-        # Обрабатываем таблицы
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for paragraph in cell.paragraphs:
-                        paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-        print("✅ Установлено выравнивание текста по ширине")
-        return True
-    except Exception as e:
-        print(f"❌ Ошибка при установке выравнивания текста: {e}")
-        return False
-
-
-def replace_quotes(text):
-    """
-    Заменяет прямые двойные кавычки на типографские кавычки-лапки.
-    """
-    # Заменяем открывающие кавычки (кавычка в начале строки или после пробела/знака препинания)
-    text = re.sub(r'(^|\s)"', r'\1«', text)
-    # Заменяем закрывающие кавычки (кавычка перед пробелом/знаком препинания/концом строки)
-    text = re.sub(r'"(\s|[.!?;,]|$)', r'»\1', text)
-    # Для оставшихся кавычек предполагаем, что они закрывающие
-    text = text.replace('"', '»')
-    return text
-
-
-def process_quotes(doc):
-    """
-    Обрабатывает замену кавычек во всем документе.
-    """
-    try:
-        # Обрабатываем параграфы в основном документе
-        for paragraph in doc.paragraphs:
-            process_paragraph_quotes(paragraph)
-        # Обрабатываем таблицы
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for paragraph in cell.paragraphs:
-                        process_paragraph_quotes(paragraph)
-        print("✅ Заменены прямые кавычки на типографские")
-        return True
-    except Exception as e:
-        print(f"❌ Ошибка при обработке кавычек: {e}")
-        return False
-
-
-def process_paragraph_quotes(paragraph):
-    """
-    Обрабатывает замену кавычек в параграфе.
-    """
-    # Собираем весь текст параграфа
-    full_text = ''.join([run.text for run in paragraph.runs])
-    if not full_text.strip():
-        return
-    # Заменяем кавычки
-    corrected_text = replace_quotes(full_text)
-    # Если текст изменился, обновляем параграф
-    if corrected_text != full_text:
-        # Сохраняем форматирование первого run для применения к новому тексту
-        first_run_format = {}
-        if paragraph.runs:
-            first_run = paragraph.runs[0]
-            first_run_format = {
-                'font_name': first_run.font.name,
-                'font_size': first_run.font.size,
-                'bold': first_run.bold,
-                'italic': first_run.italic,
-                'underline': first_run.underline
-            }
-        # Очищаем параграф и добавляем текст с исправлениями
-        paragraph.clear()
-        run = paragraph.add_run(corrected_text)
-        # Применяем базовое форматирование
-        run.font.name = first_run_format.get('font_name', 'Times New Roman')
-        run.font.size = first_run_format.get('font_size', Pt(14))
-        if first_run_format.get('bold') is not None:
-            run.bold = first_run_format.get('bold')
-        if first_run_format.get('italic') is not None:
-            run.italic = first_run_format.get('italic')
-        if first_run_format.get('underline') is not None:
-            run.underline = first_run_format.get('underline')
-
-
-def replace_special_spaces(text):
-    """
-    Заменяет специальные пробельные символы на обычные пробелы.
-    Также сжимает множественные пробелы в один.
-    """
-    # Заменяем различные виды пробелов на обычный пробел
-    special_spaces = [
-        '\u00A0',  # неразрывный пробел
-        '\u2009',  # тонкий пробел
-        '\u200A',  # волосистый пробел
-        '\u200B',  # нулевая ширина пробела
-        '\u202F',  # узкий неразрывный пробел
-        '\u205F',  # средний математический пробел
-        '\u3000',  # идеографический пробел
-    ]
-    for space in special_spaces:
-        text = text.replace(space, ' ')
-    # Заменяем множественные пробелы на один
-    text = re.sub(r' +', ' ', text)
-    return text
-
-
-def process_special_spaces(doc):
-    """
-    Обрабатывает замену специальных пробелов на обычные пробелы во всем документе.
-    """
-    try:
-        # Обрабатываем параграфы в основном документе
-        for paragraph in doc.paragraphs:
-            process_paragraph_special_spaces(paragraph)
-        # Обрабатываем таблицы
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for paragraph in cell.paragraphs:
-                        process_paragraph_special_spaces(paragraph)
-        print("✅ Заменены специальные пробелы на обычные и сжаты множественные пробелы")
-        return True
-    except Exception as e:
-        print(f"❌ Ошибка при обработке специальных пробелов: {e}")
-        return False
-
-
-def process_paragraph_special_spaces(paragraph):
-    """
-    Обрабатывает замену специальных пробелов в параграфе.
-    """
-    # Собираем весь текст параграфа
-    full_text = ''.join([run.text for run in paragraph.runs])
-    if not full_text.strip():
-        return
-    # Заменяем специальные пробелы
-    corrected_text = replace_special_spaces(full_text)
-    # Если текст изменился, обновляем параграф
-    if corrected_text != full_text:
-        # Сохраняем форматирование первого run для применения к новому тексту
-        first_run_format = {}
-        if paragraph.runs:
-            first_run = paragraph.runs[0]
-            first_run_format = {
-                'font_name': first_run.font.name,
-                'font_size': first_run.font.size,
-                'bold': first_run.bold,
-                'italic': first_run.italic,
-                'underline': first_run.underline
-            }
-        # Очищаем параграф и добавляем текст с исправлениями
-        paragraph.clear()
-        run = paragraph.add_run(corrected_text)
-        # Применяем базовое форматирование
-        run.font.name = first_run_format.get('font_name', 'Times New Roman')
-        run.font.size = first_run_format.get('font_size', Pt(14))
-        if first_run_format.get('bold') is not None:
-            run.bold = first_run_format.get('bold')
-        if first_run_format.get('italic') is not None:
-            run.italic = first_run_format.get('italic')
-        if first_run_format.get('underline') is not None:
-            run.underline = first_run_format.get('underline')
-
-
-def add_space_before_percent(text):
-    """
-    Добавляет пробел перед знаком процента, если его нет.
-    """
-    pattern = r'(\d+(?:[.,]\d+)?)\s*(?<!\s)%'
-    return re.sub(pattern, r'\1 %', text)
-
-
-def process_percent_signs(doc):
-    """
-    Обрабатывает добавление пробелов перед знаками процента во всем документе.
-    """
-    try:
-        # Обрабатываем параграфы в основном документе
-        for paragraph in doc.paragraphs:
-            process_paragraph_percent_signs(paragraph)
-        # Обрабатываем таблицы
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for paragraph in cell.paragraphs:
-                        process_paragraph_percent_signs(paragraph)
-        print("✅ Добавлены пробелы перед знаками процента")
-        return True
-    except Exception as e:
-        print(f"❌ Ошибка при обработке знаков процента: {e}")
-        return False
-
-
-def process_paragraph_percent_signs(paragraph):
-    """
-    Обрабатывает добавление пробелов перед знаками процента в параграфе.
-    """
-    # Собираем весь текст параграфа
-    full_text = ''.join([run.text for run in paragraph.runs])
-    if not full_text.strip():
-        return
-    # Добавляем пробелы перед знаками процента
-    corrected_text = add_space_before_percent(full_text)
-    # Если текст изменился, обновляем параграф
-    if corrected_text != full_text:
-        # Сохраняем форматирование первого run для применения к новому тексту
-        first_run_format = {}
-        if paragraph.runs:
-            first_run = paragraph.runs[0]
-            first_run_format = {
-                'font_name': first_run.font.name,
-                'font_size': first_run.font.size,
-                'bold': first_run.bold,
-                'italic': first_run.italic,
-                'underline': first_run.underline
-            }
-        # Очищаем параграф и добавляем текст с исправлениями
-        paragraph.clear()
-        run = paragraph.add_run(corrected_text)
-        # Применяем базовое форматирование
-        run.font.name = first_run_format.get('font_name', 'Times New Roman')
-        run.font.size = first_run_format.get('font_size', Pt(14))
-        if first_run_format.get('bold') is not None:
-            run.bold = first_run_format.get('bold')
-        if first_run_format.get('italic') is not None:
-            run.italic = first_run_format.get('italic')
-        if first_run_format.get('underline') is not None:
-            run.underline = first_run_format.get('underline')
-
-
-def normalize_stanitsa_abbreviations(text):
-    """
-    Нормализует сокращения слова "станица" к формату "ст-ца".
-    """
-    abbreviations = {
-        r'\bстани(?:ц|цы|цей|ца|це|цам|цами|цах)\b': 'ст-ца',
-        r'\bст(?:\.|\b)': 'ст-ца',
-        r'\bста(?:н|н\.)\b': 'ст-ца',
-        r'\bстц\b': 'ст-ца',
-        r'\bстани\b': 'ст-ца',
-    }
-    for pattern, replacement in abbreviations.items():
-        text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
-    return text
-
-
-def process_stanitsa_abbreviations(doc):
-    """
-    Обрабатывает нормализацию сокращений "станица" во всем документе.
-    """
-    try:
-        # Обрабатываем параграфы в основном документе
-        for paragraph in doc.paragraphs:
-            process_paragraph_stanitsa_abbreviations(paragraph)
-        # Обрабатываем таблицы
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for paragraph in cell.paragraphs:
-                        process_paragraph_stanitsa_abbreviations(paragraph)
-        print("✅ Нормализованы сокращения слова 'станица'")
-        return True
-    except Exception as e:
-        print(f"❌ Ошибка при нормализации сокращений 'станица': {e}")
-        return False
-
-
-def process_paragraph_stanitsa_abbreviations(paragraph):
-    """
-    Обрабатывает нормализацию сокращений "станица" в параграфе.
-    """
-    # Собираем весь текст параграфа
-    full_text = ''.join([run.text for run in paragraph.runs])
-    if not full_text.strip():
-        return
-    # Нормализуем сокращения
-    normalized_text = normalize_stanitsa_abbreviations(full_text)
-    # Если текст изменился, обновляем параграф
-    if normalized_text != full_text:
-        # Сохраняем форматирование первого run для применения к новому тексту
-        first_run_format = {}
-        if paragraph.runs:
-            first_run = paragraph.runs[0]
-            first_run_format = {
-                'font_name': first_run.font.name,
-                'font_size': first_run.font.size,
-                'bold': first_run.bold,
-                'italic': first_run.italic,
-                'underline': first_run.underline
-            }
-        # Очищаем параграф и добавляем нормализованный текст
-        paragraph.clear()
-        run = paragraph.add_run(normalized_text)
-        # Применяем базовое форматирование
-        run.font.name = first_run_format.get('font_name', 'Times New Roman')
-        run.font.size = first_run_format.get('font_size', Pt(14))
-        if first_run_format.get('bold') is not None:
-            run.bold = first_run_format.get('bold')
-        if first_run_format.get('italic') is not None:
-            run.italic = first_run_format.get('italic')
-        if first_run_format.get('underline') is not None:
-            run.underline = first_run_format.get('underline')
-
-
-def normalize_dates_in_text(text):
-    """
-    Преобразует даты в тексте к формату "12 марта 2024 г."
-    """
-
-    def replace_dd_mm_yyyy(match):
-        day, month, year = match.groups()
-        try:
-            month_key = str(int(month))
-            month_name = MONTH_NAMES.get(month_key)
-            if not month_name:
-                return match.group()
-            if len(year) == 2:
-                year = f"20{year}" if int(year) < 30 else f"19{year}"
-            return f"{int(day)} {month_name} {year} г."
-        except (ValueError, KeyError):
-            return match.group()
-
-    def replace_yyyy_mm_dd(match):
-        year, month, day = match.groups()
-        try:
-            month_key = str(int(month))
-            month_name = MONTH_NAMES.get(month_key)
-            if not month_name:
-                return match.group()
-            return f"{int(day)} {month_name} {year} г."
-        except (ValueError, KeyError):
-            return match.group()
-
-    def replace_day_month_year(match):
-        day, month, year = match.groups()
-        return f"{day} {month} {year} г."
-
-    def replace_day_month_abbr_year(match):
-        day, month_abbr, year = match.groups()
-        month_full = {
-            'янв': 'января', 'фев': 'февраля', 'мар': 'марта',
-            'апр': 'апреля', 'май': 'мая', 'июн': 'июня',
-            'июл': 'июля', 'авг': 'августа', 'сен': 'сентября',
-            'окт': 'октября', 'ноя': 'ноября', 'дек': 'декабря'
-        }.get(month_abbr.lower(), month_abbr)
-        return f"{day} {month_full} {year} г."
-
-    def replace_day_month_year_g_dot(match):
-        day, month, year = match.groups()
-        return f"{day} {month} {year} г."
-
-    def replace_day_month_abbr_year_g_dot(match):
-        day, month_abbr, year = match.groups()
-        month_full = {
-            'янв': 'января', 'фев': 'февраля', 'мар': 'марта',
-            'апр': 'апреля', 'май': 'мая', 'июн': 'июня',
-            'июл': 'июля', 'авг': 'августа', 'сен': 'сентября',
-            'окт': 'октября', 'ноя': 'ноября', 'дек': 'декабря'
-        }.get(month_abbr.lower(), month_abbr)
-        return f"{day} {month_full} {year} г."
-
-    text = re.sub(r'\b(\d{1,2})[./-](\d{1,2})[./-](\d{2,4})\b', replace_dd_mm_yyyy, text)
-    text = re.sub(r'\b(\d{4})[./-](\d{1,2})[./-](\d{1,2})\b', replace_yyyy_mm_dd, text)
-    text = re.sub(r'\b(\d{1,2})\s+(янв|фев|мар|апр|май|июн|июл|авг|сен|окт|ноя|дек)[.]\s*(\d{4})\b',
-                  replace_day_month_abbr_year, text)
-    text = re.sub(r'\b(\d{1,2})\s+(янв|фев|мар|апр|май|июн|июл|авг|сен|окт|ноя|дек)[.]\s*(\d{4})\s+г\.\b',
-                  replace_day_month_abbr_year_g_dot, text)
-    text = re.sub(
-        r'\b(\d{1,2})\s+(января|февраля|марта|апреля|мая|июня|июля|августа|сентября|октября|ноября|декабря)\s+(\d{4})\s+г\.\b',
-        replace_day_month_year_g_dot, text)
-    text = re.sub(
-        r'\b(\d{1,2})\s+(января|февраля|марта|апреля|мая|июня|июля|августа|сентября|октября|ноября|декабря)\s+(\d{4})\b(?!\s*г)',
-        replace_day_month_year, text)
-    return text
-
-
-def normalize_dates(doc):
-    """
-    Нормализует даты во всем документе
-    """
-    try:
-        # Обрабатываем параграфы в основном документе
-        for paragraph in doc.paragraphs:
-            normalize_paragraph_dates(paragraph)
-        # Обрабатываем таблицы
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for paragraph in cell.paragraphs:
-                        normalize_paragraph_dates(paragraph)
-        print("✅ Даты нормализованы")
-        return True
-    except Exception as e:
-        print(f"❌ Ошибка при нормализации дат: {e}")
-        return False
-
-
-def normalize_paragraph_dates(paragraph):
-    """
-    Нормализует даты в параграфе
-    """
-    # Собираем весь текст параграфа
-    full_text = ''.join([run.text for run in paragraph.runs])
-    if not full_text.strip():
-        return
-    # Нормализуем даты в тексте
-    normalized_text = normalize_dates_in_text(full_text)
-    # Если текст изменился, обновляем параграф
-    if normalized_text != full_text:
-        # Сохраняем форматирование первого run для применения к новому тексту
-        first_run_format = {}
-        if paragraph.runs:
-            first_run = paragraph.runs[0]
-            first_run_format = {
-                'font_name': first_run.font.name,
-                'font_size': first_run.font.size,
-                'bold': first_run.bold,
-                'italic': first_run.italic,
-                'underline': first_run.underline
-            }
-        # Очищаем параграф и добавляем нормализованный текст
-        paragraph.clear()
-        run = paragraph.add_run(normalized_text)
-        # Применяем базовое форматирование
-        run.font.name = first_run_format.get('font_name', 'Times New Roman')
-        run.font.size = first_run_format.get('font_size', Pt(14))
-        if first_run_format.get('bold') is not None:
-            run.bold = first_run_format.get('bold')
-        if first_run_format.get('italic') is not None:
-            run.italic = first_run_format.get('italic')
-        if first_run_format.get('underline') is not None:
-            run.underline = first_run_format.get('underline')
-
-
-def convert_decimal_separator_in_text(text):
-    """
-    Преобразует десятичные разделители в числах с точки на запятую
-    """
-
-    def replace_decimal_point(match):
-        return match.group().replace('.', ',')
-
-    pattern = r'(?<!\d[.,])\b\d+\.\d+\b(?![.,]\d)'
-    text = re.sub(pattern, replace_decimal_point, text)
-    return text
-
-
-def process_decimal_separators(doc):
-    """
-    Обрабатывает замену десятичных разделителей во всем документе
-    """
-    try:
-        # Обрабатываем параграфы в основном документе
-        for paragraph in doc.paragraphs:
-            process_paragraph_decimal_separators(paragraph)
-        # Обрабатываем таблицы
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for paragraph in cell.paragraphs:
-                        process_paragraph_decimal_separators(paragraph)
-        print("✅ Заменены десятичные разделители (точка → запятая)")
-        return True
-    except Exception as e:
-        print(f"❌ Ошибка при замене десятичных разделителей: {e}")
-        return False
-
-
-def process_paragraph_decimal_separators(paragraph):
-    """
-    Обрабатывает замену десятичных разделителей в параграфе
-    """
-    # Собираем весь текст параграфа
-    full_text = ''.join([run.text for run in paragraph.runs])
-    if not full_text.strip():
-        return
-    # Заменяем десятичные разделители
-    converted_text = convert_decimal_separator_in_text(full_text)
-    # Если текст изменился, обновляем параграф
-    if converted_text != full_text:
-        # Сохраняем форматирование первого run для применения к новому тексту
-        first_run_format = {}
-        if paragraph.runs:
-            first_run = paragraph.runs[0]
-            first_run_format = {
-                'font_name': first_run.font.name,
-                'font_size': first_run.font.size,
-                'bold': first_run.bold,
-                'italic': first_run.italic,
-                'underline': first_run.underline
-            }
-        # Очищаем параграф и добавляем текст с заменами
-        paragraph.clear()
-        run = paragraph.add_run(converted_text)
-        # Применяем базовое форматирование
-        run.font.name = first_run_format.get('font_name', 'Times New Roman')
-        run.font.size = first_run_format.get('font_size', Pt(14))
-        if first_run_format.get('bold') is not None:
-            run.bold = first_run_format.get('bold')
-        if first_run_format.get('italic') is not None:
-            run.italic = first_run_format.get('italic')
-        if first_run_format.get('underline') is not None:
-            run.underline = first_run_format.get('underline')
-
-
-def is_likely_date(text):
-    """
-    Проверяет, является ли текст похожим на дату
-    """
-    date_patterns = [
-        r'\d{1,2}[./-]\d{1,2}[./-]\d{2,4}',
-        r'\d{4}[./-]\d{1,2}[./-]\d{1,2}',
-        r'\d{1,2}\s+(января|февраля|марта|апреля|мая|июня|июля|августа|сентября|октября|ноября|декабря)\s+\d{4}',
-        r'\d{1,2}\s+(января|февраля|марта|апреля|мая|июня|июля|августа|сентября|октября|ноября|декабря)\s+\d{4}\s*г\.?',
-        r'\d{1,2}\s+(янв|фев|мар|апр|май|июн|июл|авг|сен|окт|ноя|дек)[.]\s*\d{4}',
-    ]
-    text_lower = text.lower().strip()
-    for pattern in date_patterns:
-        if re.search(pattern, text_lower, re.IGNORECASE):
-            return True
-    return False
-
-
-def contains_month_word(text):
-    """
-    Проверяет, содержит ли текст название месяца после числа
-    """
-    month_patterns = [
-        r'\d+\s+(января|февраля|марта|апреля|мая|июня|июля|августа|сентября|октября|ноября|декабря)',
-        r'\d+\s+(янв|фев|мар|апр|май|июн|июл|авг|сен|окт|ноя|дек)[.]'
-    ]
-    text_lower = text.lower()
-    for pattern in month_patterns:
-        if re.search(pattern, text_lower):
-            return True
-    return False
-
-
-def contains_year_word_to_exclude(text, number_text):
-    """
-    Проверяет, содержит ли текст слово "год" или "г." непосредственно после указанного числа.
-    """
-    exclude_year_patterns = [
-        rf'\b{re.escape(number_text)}\s+год\b',
-        rf'\b{re.escape(number_text)}\s*г\.',
-    ]
-    text_lower = text.lower()
-    for pattern in exclude_year_patterns:
-        if re.search(pattern, text_lower):
-            return True
-    return False
-
-
-def make_numbers_bold(doc):
-    """
-    Выделяет жирным все числа (кроме дат и чисел с "год" и "г."), но не выделяет числа в составе номеров (№ А3233 344/2 025)
-    """
-    try:
-        number_patterns = [
-            r'[+-]?\d{1,3}(?:\s\d{3})*(?:[.,]\d+)?',
-            r'[+-]?\d{1,3}(?:\u2009\d{3})*(?:[.,]\d+)?',
-            r'[+-]?\d{1,3}(?:,\d{3})*(?:[.,]\d+)?',
-            r'[+-]?\d{1,3}(?:\.\d{3})*(?:[.,]\d+)?',
-            r'[+-]?\d+(?:[.,]\d+)?',
-        ]
-        for paragraph in doc.paragraphs:
-            process_paragraph_numbers(paragraph, number_patterns)
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for paragraph in cell.paragraphs:
-                        process_paragraph_numbers(paragraph, number_patterns)
-        print("✅ Числа выделены жирным (даты, 'год' и номера дел исключены)")
-        return True
-    except Exception as e:
-        print(f"❌ Ошибка при выделении чисел: {e}")
-        return False
-
-
-def process_paragraph_numbers(paragraph, number_patterns):
-    """
-    Обрабатывает числа в параграфе
-    """
-    runs_text = [run.text for run in paragraph.runs]
-    full_text = ''.join(runs_text)
-    if not full_text.strip():
-        return
-
-    numbers_found = []
-    for pattern in number_patterns:
-        for match in re.finditer(pattern, full_text):
-            number_text = match.group()
-            start_pos = match.start()
-            end_pos = match.end()
-            # Расширенный контекст
-            context_start = max(0, start_pos - 50)
-            context_end = min(len(full_text), end_pos + 50)
-            context = full_text[context_start:context_end]
-
-            if (is_likely_date(context) or
-                    contains_month_word(context) or
-                    contains_year_word_to_exclude(context, number_text) or
-                    is_part_of_document_number(context)):
-                continue  # Пропускаем
-
-            numbers_found.append({
-                'text': number_text,
-                'start': start_pos,
-                'end': end_pos
-            })
-
-    # Удаление пересекающихся совпадений
-    if numbers_found:
-        numbers_found.sort(key=lambda x: x['start'])
-        filtered = []
-        for num in numbers_found:
-            if not any(n['start'] < num['end'] and n['end'] > num['start'] for n in filtered):
-                filtered.append(num)
-        numbers_found = filtered
-
-    if not numbers_found:
-        return
-
-    paragraph.clear()
-    last_pos = 0
-    for num in numbers_found:
-        if num['start'] > last_pos:
-            before = full_text[last_pos:num['start']]
-            run = paragraph.add_run(before)
-            run.font.name = 'Times New Roman'
-            run.font.size = Pt(14)
-            run.bold = False
-        bold_run = paragraph.add_run(num['text'])
-        bold_run.bold = True
-        bold_run.font.name = 'Times New Roman'
-        bold_run.font.size = Pt(14)
-        last_pos = num['end']
-    if last_pos < len(full_text):
-        after = full_text[last_pos:]
-        run = paragraph.add_run(after)
-        run.font.name = 'Times New Roman'
-        run.font.size = Pt(14)
-        run.bold = False
-
-
-def reset_text_formatting_except_bold(doc):
-    """
-    Сбрасывает все форматирование текста, кроме жирного выделения
-    """
-    try:
-        for paragraph in doc.paragraphs:
-            for run in paragraph.runs:
-                is_bold = run.bold
-                run.font.name = None
-                run.font.size = None
-                run.font.bold = None
-                run.font.italic = None
-                run.font.underline = None
-                run.font.color.rgb = None
-                if is_bold is not None:
-                    run.bold = is_bold
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for paragraph in cell.paragraphs:
-                        for run in paragraph.runs:
-                            is_bold = run.bold
-                            run.font.name = None
-                            run.font.size = None
-                            run.font.bold = None
-                            run.font.italic = None
-                            run.font.underline = None
-                            run.font.color.rgb = None
-                            if is_bold is not None:
-                                run.bold = is_bold
-        print("✅ Форматирование текста сброшено (сохранено только жирное выделение)")
-        return True
-    except Exception as e:
-        print(f"❌ Ошибка при сбросе форматирования: {e}")
-        return False
-
-
-def apply_uniform_formatting(doc):
-    """
-    Применяет единый стиль ко всему документу
-    """
-    try:
-        for paragraph in doc.paragraphs:
-            for run in paragraph.runs:
-                run.font.name = 'Times New Roman'
-                run.font.size = Pt(14)
-            pf = paragraph.paragraph_format
-            pf.line_spacing = 1.5
-            pf.space_before = Pt(0)
-            pf.space_after = Pt(0)
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for paragraph in cell.paragraphs:
-                        for run in paragraph.runs:
-                            run.font.name = 'Times New Roman'
-                            run.font.size = Pt(14)
-                        pf = paragraph.paragraph_format
-                        pf.line_spacing = 1.5
-        print("✅ Установлен единый стиль: Times New Roman, 14pt, интервал 1.5")
-        return True
-    except Exception as e:
-        print(f"❌ Ошибка при применении единого стиля: {e}")
-        return False
-
-
-def format_thousands_separator_in_text(text):
-    """
-    Форматирует числа с разделителями тысяч (пробелы)
-    Пример: 1000 -> 1 000, 2500000 -> 2 500 000, 12345.67 -> 12 345,67
-    """
-
-    def format_match(match):
-        sign = match.group(1)  # знак (+ или -)
-        integer_part = match.group(2)  # целая часть
-        decimal_part = match.group(3)  # десятичная часть с разделителем
-
-        # Форматируем целую часть: разбиваем на группы по 3 цифры
-        integer_rev = integer_part[::-1]
-        chunks = [integer_rev[i:i + 3] for i in range(0, len(integer_rev), 3)]
-        formatted_integer = ' '.join(chunks)[::-1]
-
-        return sign + formatted_integer + decimal_part
-
-    # Шаблон для чисел:
-    #   [+-]? - необязательный знак
-    #   \d{1,3} - от 1 до 3 цифр
-    #   (?:\d{3})* - группы по 3 цифры (0 или более)
-    #   (?:[.,]\d+)? - необязательная десятичная часть
-    pattern = r'\b([+-]?)(\d{1,3}(?:\d{3})*)([.,]?\d*)\b'
-    return re.sub(pattern, format_match, text)
-
-
-def process_thousands_separator(doc):
-    """
-    Форматирует числа с разделителями тысяч во всем документе
-    """
-    try:
-        # Обрабатываем параграфы
-        for paragraph in doc.paragraphs:
-            process_paragraph_thousands_separator(paragraph)
-        # Обрабатываем таблицы
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for paragraph in cell.paragraphs:
-                        process_paragraph_thousands_separator(paragraph)
-        print("✅ Числа отформатированы с разделителями тысяч (пробел)")
-        return True
-    except Exception as e:
-        print(f"❌ Ошибка при форматировании разделителей тысяч: {e}")
-        return False
-
-
-def process_paragraph_thousands_separator(paragraph):
-    """
-    Форматирует числа с разделителями тысяч в параграфе
-    """
-    # Собираем весь текст параграфа
-    full_text = ''.join([run.text for run in paragraph.runs])
-    if not full_text.strip():
-        return
-
-    # Форматируем числа
-    formatted_text = format_thousands_separator_in_text(full_text)
-
-    # Если текст изменился, обновляем параграф
-    if formatted_text != full_text:
-        # Сохраняем форматирование первого run
-        first_run_format = {}
-        if paragraph.runs:
-            first_run = paragraph.runs[0]
-            first_run_format = {
-                'font_name': first_run.font.name,
-                'font_size': first_run.font.size,
-                'bold': first_run.bold,
-                'italic': first_run.italic,
-                'underline': first_run.underline
-            }
-
-        # Очищаем параграф и добавляем отформатированный текст
-        paragraph.clear()
-        run = paragraph.add_run(formatted_text)
-
-        # Восстанавливаем форматирование
-        run.font.name = first_run_format.get('font_name', 'Times New Roman')
-        run.font.size = first_run_format.get('font_size', Pt(14))
-        if first_run_format.get('bold') is not None:
-            run.bold = first_run_format.get('bold')
-        if first_run_format.get('italic') is not None:
-            run.italic = first_run_format.get('italic')
-        if first_run_format.get('underline') is not None:
-            run.underline = first_run_format.get('underline')
-
-
-def set_document_margins(doc_path):
-    """
-    Основная функция обработки документа
-    """
-    try:
-        if not os.path.exists(doc_path):
-            print(f"❌ Файл не найден: {doc_path}")
-            return False
-        doc = Document(doc_path)
-        for i, section in enumerate(doc.sections):
-            print(f"Обрабатываем секцию {i + 1}")
-            section.top_margin = Cm(1.0)
-            section.right_margin = Cm(1.5)
-            section.bottom_margin = Cm(1.0)
-            section.left_margin = Cm(1.5)
-
-        if not reset_text_formatting_except_bold(doc):
-            return False
-        if not apply_uniform_formatting(doc):
-            return False
-        if not process_special_spaces(doc):
-            return False
-        if not process_quotes(doc):
-            return False
-        if not normalize_dates(doc):
-            return False
-        if not process_decimal_separators(doc):
-            return False
-        if not process_percent_signs(doc):
-            return False
-        if not process_stanitsa_abbreviations(doc):
-            return False
-        if not process_thousands_separator(doc):  # Новый шаг форматирования тысяч
-            return False
-        if not make_numbers_bold(doc):
-            return False
-        if not set_justify_alignment(doc):
-            return False
-
-        name, ext = os.path.splitext(doc_path)
-        output_path = f"{name}_formatted{ext}"
-        doc.save(output_path)
-        print(f"✅ Успешно! Документ сохранён как: {output_path}")
-        return True
-    except Exception as e:
-        print(f"❌ Ошибка: {e}")
-        return False
-
-
-def main():
-    print("=== Редактор Word документов ===")
-    print("Выполняемые действия:")
-    print("1. Установка полей: Верх=1см, Право=1.5см, Низ=1см, Лево=1.5см")
-    print("2. Сброс форматирования (сохранено только жирное выделение)")
-    print("3. Установка стиля: Times New Roman, 14pt, интервал 1.5")
-    print("4. Замена специальных пробелов на обычные")
-    print("5. Замена прямых кавычек на типографские")
-    print("6. Нормализация дат")
-    print("7. Замена десятичных разделителей (точка → запятая)")
-    print("8. Добавление пробелов перед знаками процента")
-    print("9. Нормализация сокращений 'станица'")
-    print("10. Форматирование разделителей тысяч (1 000)")
-    print("11. Выделение чисел жирным (даты, 'год' и номера дел исключены)")
-    print("12. Выравнивание по ширине")
-    print("-" * 65)
-
-    if len(sys.argv) > 1:
-        file_path = sys.argv[1].strip('"\'')
-    else:
-        file_path = input("Введите путь к .docx файлу: ").strip().strip('"\'')
-    if not file_path.lower().endswith('.docx'):
-        print("⚠️ Файл должен иметь расширение .docx")
-        return
-
-    success = set_document_margins(file_path)
-    if not success:
-        print("❌ Обработка завершена с ошибками")
-    else:
-        print("🎉 Обработка завершена успешно!")
-
-
-if __name__ == "__main__":
-    main()
+import os
+import sys
+import re
+import io
+import glob
+import copy
+import json
+import time
+import bisect
+import calendar
+import difflib
+import shutil
+import struct
+import signal
+import hashlib
+import tempfile
+import zipfile
+import posixpath
+import zlib
+import argparse
+import functools
+import itertools
+import threading
+import contextlib
+import urllib.parse
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError, as_completed
+from lxml import etree
+from docx import Document
+from docx.shared import Cm, Emu, Pt, Twips
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml.ns import qn
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.parser import OxmlElement, parse_xml
+from docx.text.paragraph import Paragraph
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11: профили только в JSON
+    tomllib = None
+
+# Словарь для преобразования номеров месяцев в названия
+MONTH_NAMES = {
+    '1': 'января', '01': 'января',
+    '2': 'февраля', '02': 'февраля',
+    '3': 'марта', '03': 'марта',
+    '4': 'апреля', '04': 'апреля',
+    '5': 'мая', '05': 'мая',
+    '6': 'июня', '06': 'июня',
+    '7': 'июля', '07': 'июля',
+    '8': 'августа', '08': 'августа',
+    '9': 'сентября', '09': 'сентября',
+    '10': 'октября',
+    '11': 'ноября',
+    '12': 'декабря'
+}
+
+# Сокращённые названия месяцев
+MONTH_ABBREVIATIONS = {
+    'янв': 'января', 'фев': 'февраля', 'мар': 'марта',
+    'апр': 'апреля', 'май': 'мая', 'июн': 'июня',
+    'июл': 'июля', 'авг': 'августа', 'сен': 'сентября',
+    'окт': 'октября', 'ноя': 'ноября', 'дек': 'декабря'
+}
+
+
+class TextRule:
+    """
+    Правило обработки текста: функция с именем, порядком применения и версией.
+    requires — регулярное выражение, которое обязано найтись в тексте, чтобы правило
+    могло что-то изменить; без совпадения правило пропускается.
+    title — описание правила в списке выполняемых действий.
+    """
+
+    def __init__(self, name, order, version, func, kind='text', requires=None, title=None):
+        self.name = name
+        self.order = order
+        self.version = version
+        self.func = func
+        self.kind = kind
+        self.requires = requires
+        self.title = title or name
+        self._prefilter = re.compile(requires).search if requires else None
+
+    def __call__(self, text):
+        return self.func(text)
+
+    def apply(self, text):
+        """
+        Применяет правило и возвращает (текст, число замен).
+        Время вызова учитывается в замерах правила
+        """
+        before = REPLACEMENTS.total
+        start = time.perf_counter()
+        new_text = self.func(text)
+        STATS.time_rule(self.name, time.perf_counter() - start)
+        return new_text, REPLACEMENTS.total - before
+
+    def find(self, text):
+        """
+        Поиск фрагментов правилом kind='spans' с учётом времени в замерах правила
+        """
+        start = time.perf_counter()
+        found = self.func(text)
+        STATS.time_rule(self.name, time.perf_counter() - start)
+        return found
+
+    def accepts(self, text):
+        """
+        Быстрая проверка: может ли правило изменить текст (или найти в нём фрагменты)
+        """
+        return self._prefilter is None or self._prefilter(text) is not None
+
+    def __repr__(self):
+        return f"TextRule({self.name!r}, order={self.order}, version={self.version})"
+
+
+class RuleRegistry:
+    """
+    Реестр правил обработки текста.
+    Шаблоны правил компилируются один раз при загрузке модуля,
+    реестр хранит сами правила и задаёт порядок их применения.
+    """
+
+    def __init__(self):
+        self._rules = {}
+
+    def register(self, name, order, version=1, kind='text', requires=None, title=None):
+        """
+        Декоратор: регистрирует функцию как правило и возвращает её без изменений.
+        kind='text' — преобразование текста, kind='spans' — поиск фрагментов.
+        requires — необходимое условие срабатывания правила (регулярное выражение).
+        """
+        def decorator(func):
+            self._rules[name] = TextRule(name, order, version, func, kind, requires, title)
+            return func
+        return decorator
+
+    def get(self, name):
+        return self._rules[name]
+
+    def __contains__(self, name):
+        return name in self._rules
+
+    def ordered(self, kind='text'):
+        """
+        Возвращает правила указанного типа в порядке применения
+        """
+        rules = [rule for rule in self._rules.values() if rule.kind == kind]
+        return sorted(rules, key=lambda rule: rule.order)
+
+    def prefilter(self, rules=None):
+        """
+        Объединённое условие правил (по умолчанию всех): текст без совпадения не изменит ни одно из них.
+        Возвращает скомпилированное выражение или None, если у какого-то правила условия нет.
+        """
+        if rules is None:
+            rules = self._rules.values()
+        patterns = list(dict.fromkeys(rule.requires for rule in rules))
+        if not patterns or None in patterns:
+            return None
+        return re.compile('|'.join(f'(?:{pattern})' for pattern in patterns))
+
+    @property
+    def version(self):
+        """
+        Версия набора правил: меняется при изменении состава, порядка или версии любого правила
+        """
+        rules = sorted(self._rules.values(), key=lambda rule: rule.order)
+        return ';'.join(f"{rule.name}:{rule.order}:{rule.version}" for rule in rules)
+
+
+RULES = RuleRegistry()
+
+
+class ReplacementCounter(threading.local):
+    """
+    Общий счётчик замен, сделанных правилами через counted_sub (свой в каждом потоке)
+    """
+
+    def __init__(self):
+        self.total = 0
+
+
+REPLACEMENTS = ReplacementCounter()
+
+
+def counted_sub(pattern, repl, text):
+    """
+    pattern.sub с подсчётом замен. Для функции замены учитываются только совпадения,
+    которые она действительно изменила.
+    """
+    if not callable(repl):
+        text, count = pattern.subn(repl, text)
+        REPLACEMENTS.total += count
+        return text
+
+    def counting_repl(match):
+        result = repl(match)
+        if result != match.group():
+            REPLACEMENTS.total += 1
+        return result
+    return pattern.sub(counting_repl, text)
+
+
+# Счётчики каждого этапа обработки
+STAGE_COUNTERS = ('paragraphs_visited', 'paragraphs_changed', 'replacements', 'runs_created', 'runs_merged')
+# Счётчики каждого правила: paragraphs_visited — сколько раз правило вызывалось
+# (параграфы, прошедшие его предварительную проверку). Результаты из кэша параграфов
+# не вызывают правила и учитываются только в paragraphs_changed и replacements
+RULE_COUNTERS = ('paragraphs_visited', 'paragraphs_changed', 'replacements', 'runs_created')
+
+
+class ProcessingStats(threading.local):
+    """
+    Замеры обработки документа: время и счётчики по этапам, время загрузки и сохранения,
+    время и изменения по правилам. Этапы и правила пишут в общий экземпляр STATS; его состояние своё
+    в каждом потоке, поэтому документы, обрабатываемые в разных потоках, не смешивают замеры.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.document = {}
+        self.stages = {}
+        self.rules = {}
+        self._current = None
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Замер этапа: время выполнения и счётчики, переданные в count() внутри блока
+        """
+        record = self.stages.get(name)
+        if record is None:
+            record = self.stages[name] = {'wall_time': 0.0, **dict.fromkeys(STAGE_COUNTERS, 0)}
+        previous, self._current = self._current, record
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['wall_time'] += time.perf_counter() - start
+            self._current = previous
+
+    @contextlib.contextmanager
+    def timed(self, name):
+        """
+        Замер операции над документом целиком (загрузка, сохранение)
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.document[name] = self.document.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, **counters):
+        if self._current is not None:
+            for key, value in counters.items():
+                self._current[key] += value
+
+    def rule(self, name):
+        """
+        Запись замеров правила: время вызовов и счётчики RULE_COUNTERS
+        """
+        record = self.rules.get(name)
+        if record is None:
+            record = self.rules[name] = {'wall_time': 0.0, **dict.fromkeys(RULE_COUNTERS, 0)}
+        return record
+
+    def time_rule(self, name, elapsed):
+        record = self.rule(name)
+        record['wall_time'] += elapsed
+        record['paragraphs_visited'] += 1
+
+    def count_rule(self, name, replacements, runs_created=0):
+        record = self.rule(name)
+        record['paragraphs_changed'] += 1
+        record['replacements'] += replacements
+        record['runs_created'] += runs_created
+
+    def merge_rules(self, rules):
+        """
+        Добавляет замеры правил, собранные в другом процессе
+        """
+        for name, other in rules.items():
+            record = self.rule(name)
+            for key, value in other.items():
+                record[key] += value
+
+    def report(self):
+        return {
+            **self.document,
+            'stages': [{'name': name, **record} for name, record in self.stages.items()],
+            'rules': self.rules,
+        }
+
+
+STATS = ProcessingStats()
+
+
+class ProgressOutput(threading.local):
+    """
+    Поток для сообщений о ходе обработки, свой в каждом потоке. None — текущий sys.stdout.
+    """
+
+    def __init__(self):
+        self.stream = None
+
+
+OUTPUT = ProgressOutput()
+
+
+def echo(*args):
+    """
+    Сообщение о ходе обработки: print в поток OUTPUT текущего потока
+    """
+    print(*args, file=OUTPUT.stream)
+
+
+@contextlib.contextmanager
+def captured_output(stream):
+    """
+    Направляет сообщения о ходе обработки текущего потока в stream.
+    В отличие от contextlib.redirect_stdout не затрагивает другие потоки.
+    """
+    previous, OUTPUT.stream = OUTPUT.stream, stream
+    try:
+        yield stream
+    finally:
+        OUTPUT.stream = previous
+
+# Паттерны, указывающие на начало номера документа
+DOCUMENT_NUMBER_PATTERNS = [
+    re.compile(r'№\s*[\w-]*\d'),  # №, за которым следует буква/цифра (например, № А3233)
+    re.compile(r'\b[А-Я]{1,2}\d{3,}'),  # Буква + 3+ цифры (например, А3233)
+    re.compile(r'\d{3,}[/-]\d'),  # Много цифр + / или - (например, 344/2)
+    re.compile(r'\b\d{3,}\s*\d{2,4}\b'),  # Пробел между группами цифр (например, 344 025)
+]
+
+
+P_TAG = qn('w:p')
+TBL_TAG = qn('w:tbl')
+TR_TAG = qn('w:tr')
+TC_TAG = qn('w:tc')
+
+
+def record_paragraph_change(rule_name, replacements, runs_created=0):
+    """
+    Учитывает изменённый параграф в замерах текущего этапа и правила
+    """
+    STATS.count(paragraphs_changed=1, replacements=replacements, runs_created=runs_created)
+    STATS.count_rule(rule_name, replacements, runs_created)
+
+
+def collect_document_paragraphs(doc):
+    """
+    Собирает все параграфы документа в порядке следования: пары (параграф, признак таблицы).
+    Обход идёт по XML, поэтому каждая ячейка (w:tc) посещается ровно один раз —
+    объединённые ячейки не обрабатываются повторно, вложенные таблицы тоже обходятся.
+    Список собирается один раз и передаётся всем этапам обработки.
+    """
+    return [(Paragraph(p, doc), in_table) for p, in_table in collect_paragraph_elements(doc.element.body)]
+
+
+def collect_paragraph_elements(body):
+    """
+    То же, что collect_document_paragraphs, но возвращает сами элементы w:p без объектов python-docx
+    """
+    paragraphs = []
+    collect_block_paragraphs(body, False, paragraphs)
+    return paragraphs
+
+
+def collect_block_paragraphs(element, in_table, paragraphs):
+    """
+    Добавляет в список параграфы блока (тела документа или ячейки), заходя во вложенные таблицы
+    """
+    for child in element.iterchildren(P_TAG, TBL_TAG):
+        if child.tag == P_TAG:
+            paragraphs.append((child, in_table))
+            continue
+        for tr in child.iterchildren(TR_TAG):
+            for tc in tr.iterchildren(TC_TAG):
+                collect_block_paragraphs(tc, True, paragraphs)
+
+
+def set_justify_alignment(doc, paragraphs=None):
+    """
+    Устанавливает выравнивание текста по ширине во всем документе.
+    """
+    if paragraphs is None:
+        paragraphs = collect_document_paragraphs(doc)
+    try:
+        with STATS.stage('set_justify_alignment'):
+            STATS.count(paragraphs_visited=len(paragraphs))
+            for paragraph, _ in paragraphs:
+                # Параграфы, уже выровненные по ширине, не трогаем и не считаем изменёнными
+                if paragraph.alignment != WD_ALIGN_PARAGRAPH.JUSTIFY:
+                    paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+                    STATS.count(paragraphs_changed=1)
+        echo("✅ Установлено выравнивание текста по ширине")
+        return True
+    except Exception as e:
+        echo(f"❌ Ошибка при установке выравнивания текста: {e}")
+        return False
+
+
+# Открывающая кавычка: в начале строки или после пробела
+OPENING_QUOTE_RE = re.compile(r'(^|\s)"')
+# Закрывающая кавычка: перед пробелом/знаком препинания/концом строки
+CLOSING_QUOTE_RE = re.compile(r'"(\s|[.!?;,]|$)')
+
+
+@RULES.register('quotes', order=20, requires='"', title="Замена прямых кавычек на типографские")
+def replace_quotes(text):
+    """
+    Заменяет прямые двойные кавычки на типографские кавычки-лапки.
+    """
+    # Заменяем открывающие кавычки (кавычка в начале строки или после пробела/знака препинания)
+    text = counted_sub(OPENING_QUOTE_RE, r'\1«', text)
+    # Заменяем закрывающие кавычки (кавычка перед пробелом/знаком препинания/концом строки)
+    text = counted_sub(CLOSING_QUOTE_RE, r'»\1', text)
+    # Для оставшихся кавычек предполагаем, что они закрывающие
+    REPLACEMENTS.total += text.count('"')
+    text = text.replace('"', '»')
+    return text
+
+
+def process_quotes(doc, paragraphs=None, edits='rebuild'):
+    """
+    Обрабатывает замену кавычек во всем документе.
+    """
+    if paragraphs is None:
+        paragraphs = collect_document_paragraphs(doc)
+    try:
+        with STATS.stage('process_quotes'):
+            STATS.count(paragraphs_visited=len(paragraphs))
+            for paragraph, _ in paragraphs:
+                process_paragraph_quotes(paragraph, edits)
+        echo("✅ Заменены прямые кавычки на типографские")
+        return True
+    except Exception as e:
+        echo(f"❌ Ошибка при обработке кавычек: {e}")
+        return False
+
+
+def process_paragraph_quotes(paragraph, edits='rebuild'):
+    """
+    Обрабатывает замену кавычек в параграфе.
+    """
+    # Собираем весь текст параграфа
+    full_text = ''.join([run.text for run in paragraph.runs])
+    if not full_text.strip():
+        return
+    # Заменяем кавычки
+    corrected_text, replacements = RULES.get('quotes').apply(full_text)
+    # Если текст изменился, обновляем параграф
+    if corrected_text != full_text:
+        record_paragraph_change('quotes', replacements)
+        if edits == 'splice':
+            splice_run_text([run._r for run in paragraph.runs], full_text, corrected_text)
+            return
+        # Сохраняем форматирование первого run для применения к новому тексту
+        first_run_format = {}
+        if paragraph.runs:
+            first_run = paragraph.runs[0]
+            first_run_format = {
+                'font_name': first_run.font.name,
+                'font_size': first_run.font.size,
+                'bold': first_run.bold,
+                'italic': first_run.italic,
+                'underline': first_run.underline
+            }
+        # Очищаем параграф и добавляем текст с исправлениями
+        paragraph.clear()
+        run = paragraph.add_run(corrected_text)
+        STATS.count(runs_created=1)
+        # Применяем базовое форматирование
+        if first_run_format.get('font_name', 'Times New Roman') is not None:
+            run.font.name = first_run_format.get('font_name', 'Times New Roman')
+        if first_run_format.get('font_size', Pt(14)) is not None:
+            run.font.size = first_run_format.get('font_size', Pt(14))
+        if first_run_format.get('bold') is not None:
+            run.bold = first_run_format.get('bold')
+        if first_run_format.get('italic') is not None:
+            run.italic = first_run_format.get('italic')
+        if first_run_format.get('underline') is not None:
+            run.underline = first_run_format.get('underline')
+
+
+# Специальные пробельные символы, заменяемые на обычный пробел
+SPECIAL_SPACES = [
+    '\u00A0',  # неразрывный пробел
+    '\u2009',  # тонкий пробел
+    '\u200A',  # волосистый пробел
+    '\u200B',  # нулевая ширина пробела
+    '\u202F',  # узкий неразрывный пробел
+    '\u205F',  # средний математический пробел
+    '\u3000',  # идеографический пробел
+]
+SPECIAL_SPACES_TABLE = str.maketrans(dict.fromkeys(SPECIAL_SPACES, ' '))
+SPECIAL_SPACES_PREFILTER = f"[{''.join(SPECIAL_SPACES)}]| {{2}}"
+MULTIPLE_SPACES_RE = re.compile(r' {2,}')
+
+
+@RULES.register('special_spaces', order=10, requires=SPECIAL_SPACES_PREFILTER,
+                title="Замена специальных пробелов на обычные")
+def replace_special_spaces(text):
+    """
+    Заменяет специальные пробельные символы на обычные пробелы.
+    Также сжимает множественные пробелы в один.
+    """
+    # Заменяем различные виды пробелов на обычный пробел
+    translated = text.translate(SPECIAL_SPACES_TABLE)
+    if translated != text:
+        REPLACEMENTS.total += sum(text.count(space) for space in SPECIAL_SPACES)
+    # Заменяем множественные пробелы на один
+    text = counted_sub(MULTIPLE_SPACES_RE, ' ', translated)
+    return text
+
+
+def process_special_spaces(doc, paragraphs=None, edits='rebuild'):
+    """
+    Обрабатывает замену специальных пробелов на обычные пробелы во всем документе.
+    """
+    if paragraphs is None:
+        paragraphs = collect_document_paragraphs(doc)
+    try:
+        with STATS.stage('process_special_spaces'):
+            STATS.count(paragraphs_visited=len(paragraphs))
+            for paragraph, _ in paragraphs:
+                process_paragraph_special_spaces(paragraph, edits)
+        echo("✅ Заменены специальные пробелы на обычные и сжаты множественные пробелы")
+        return True
+    except Exception as e:
+        echo(f"❌ Ошибка при обработке специальных пробелов: {e}")
+        return False
+
+
+def process_paragraph_special_spaces(paragraph, edits='rebuild'):
+    """
+    Обрабатывает замену специальных пробелов в параграфе.
+    """
+    # Собираем весь текст параграфа
+    full_text = ''.join([run.text for run in paragraph.runs])
+    if not full_text.strip():
+        return
+    # Заменяем специальные пробелы
+    corrected_text, replacements = RULES.get('special_spaces').apply(full_text)
+    # Если текст изменился, обновляем параграф
+    if corrected_text != full_text:
+        record_paragraph_change('special_spaces', replacements)
+        if edits == 'splice':
+            splice_run_text([run._r for run in paragraph.runs], full_text, corrected_text)
+            return
+        # Сохраняем форматирование первого run для применения к новому тексту
+        first_run_format = {}
+        if paragraph.runs:
+            first_run = paragraph.runs[0]
+            first_run_format = {
+                'font_name': first_run.font.name,
+                'font_size': first_run.font.size,
+                'bold': first_run.bold,
+                'italic': first_run.italic,
+                'underline': first_run.underline
+            }
+        # Очищаем параграф и добавляем текст с исправлениями
+        paragraph.clear()
+        run = paragraph.add_run(corrected_text)
+        STATS.count(runs_created=1)
+        # Применяем базовое форматирование
+        if first_run_format.get('font_name', 'Times New Roman') is not None:
+            run.font.name = first_run_format.get('font_name', 'Times New Roman')
+        if first_run_format.get('font_size', Pt(14)) is not None:
+            run.font.size = first_run_format.get('font_size', Pt(14))
+        if first_run_format.get('bold') is not None:
+            run.bold = first_run_format.get('bold')
+        if first_run_format.get('italic') is not None:
+            run.italic = first_run_format.get('italic')
+        if first_run_format.get('underline') is not None:
+            run.underline = first_run_format.get('underline')
+
+
+# Сокращения слова "станица" и их замены
+STANITSA_ABBREVIATIONS = [
+    (re.compile(r'\bстани(?:ц|цы|цей|ца|це|цам|цами|цах)\b', re.IGNORECASE), 'ст-ца'),
+    # Уже нормализованное "ст-ца" не трогаем, иначе повторная обработка даёт "ст-ца-ца"
+    (re.compile(r'\bст(?:\.|\b)(?!-ца)', re.IGNORECASE), 'ст-ца'),
+    (re.compile(r'\bста(?:н|н\.)\b', re.IGNORECASE), 'ст-ца'),
+    (re.compile(r'\bстц\b', re.IGNORECASE), 'ст-ца'),
+    (re.compile(r'\bстани\b', re.IGNORECASE), 'ст-ца'),
+]
+
+
+@RULES.register('stanitsa', order=60, version=2, requires=r'(?i:\bст)',
+                title="Нормализация сокращений 'станица'")
+def normalize_stanitsa_abbreviations(text):
+    """
+    Нормализует сокращения слова "станица" к формату "ст-ца".
+    """
+    for pattern, replacement in STANITSA_ABBREVIATIONS:
+        text = counted_sub(pattern, replacement, text)
+    return text
+
+
+def process_stanitsa_abbreviations(doc, paragraphs=None, edits='rebuild'):
+    """
+    Обрабатывает нормализацию сокращений "станица" во всем документе.
+    """
+    if paragraphs is None:
+        paragraphs = collect_document_paragraphs(doc)
+    try:
+        with STATS.stage('process_stanitsa_abbreviations'):
+            STATS.count(paragraphs_visited=len(paragraphs))
+            for paragraph, _ in paragraphs:
+                process_paragraph_stanitsa_abbreviations(paragraph, edits)
+        echo("✅ Нормализованы сокращения слова 'станица'")
+        return True
+    except Exception as e:
+        echo(f"❌ Ошибка при нормализации сокращений 'станица': {e}")
+        return False
+
+
+def process_paragraph_stanitsa_abbreviations(paragraph, edits='rebuild'):
+    """
+    Обрабатывает нормализацию сокращений "станица" в параграфе.
+    """
+    # Собираем весь текст параграфа
+    full_text = ''.join([run.text for run in paragraph.runs])
+    if not full_text.strip():
+        return
+    # Нормализуем сокращения
+    normalized_text, replacements = RULES.get('stanitsa').apply(full_text)
+    # Если текст изменился, обновляем параграф
+    if normalized_text != full_text:
+        record_paragraph_change('stanitsa', replacements)
+        if edits == 'splice':
+            splice_run_text([run._r for run in paragraph.runs], full_text, normalized_text)
+            return
+        # Сохраняем форматирование первого run для применения к новому тексту
+        first_run_format = {}
+        if paragraph.runs:
+            first_run = paragraph.runs[0]
+            first_run_format = {
+                'font_name': first_run.font.name,
+                'font_size': first_run.font.size,
+                'bold': first_run.bold,
+                'italic': first_run.italic,
+                'underline': first_run.underline
+            }
+        # Очищаем параграф и добавляем нормализованный текст
+        paragraph.clear()
+        run = paragraph.add_run(normalized_text)
+        STATS.count(runs_created=1)
+        # Применяем базовое форматирование
+        if first_run_format.get('font_name', 'Times New Roman') is not None:
+            run.font.name = first_run_format.get('font_name', 'Times New Roman')
+        if first_run_format.get('font_size', Pt(14)) is not None:
+            run.font.size = first_run_format.get('font_size', Pt(14))
+        if first_run_format.get('bold') is not None:
+            run.bold = first_run_format.get('bold')
+        if first_run_format.get('italic') is not None:
+            run.italic = first_run_format.get('italic')
+        if first_run_format.get('underline') is not None:
+            run.underline = first_run_format.get('underline')
+
+
+# Номер месяца по его названию в родительном падеже
+MONTH_NUMBERS = {name: int(number) for number, name in MONTH_NAMES.items()}
+MONTH_NAMES_PATTERN = '|'.join(dict.fromkeys(MONTH_NAMES.values()))
+MONTH_ABBREVIATIONS_PATTERN = '|'.join(MONTH_ABBREVIATIONS)
+
+
+def is_valid_date(day, month, year):
+    """
+    Проверяет, что день и месяц существуют (с учётом високосного года)
+    """
+    if not 1 <= month <= 12:
+        return False
+    days = 29 if month == 2 and calendar.isleap(year) else calendar.mdays[month]
+    return 1 <= day <= days
+
+
+def replace_dd_mm_yyyy(match):
+    day, month, year = match.group('dmy_day', 'dmy_month', 'dmy_year')
+    if len(year) == 2:
+        year = f"20{year}" if int(year) < 30 else f"19{year}"
+    if not is_valid_date(int(day), int(month), int(year)):
+        return match.group()
+    return f"{int(day)} {MONTH_NAMES[str(int(month))]} {year} г."
+
+
+def replace_yyyy_mm_dd(match):
+    year, month, day = match.group('ymd_year', 'ymd_month', 'ymd_day')
+    if not is_valid_date(int(day), int(month), int(year)):
+        return match.group()
+    return f"{int(day)} {MONTH_NAMES[str(int(month))]} {year} г."
+
+
+def replace_day_month_abbr_year(match):
+    day, month_abbr, year = match.group('abbr_day', 'abbr_month', 'abbr_year')
+    month_full = MONTH_ABBREVIATIONS[month_abbr]
+    if not is_valid_date(int(day), MONTH_NUMBERS[month_full], int(year)):
+        return match.group()
+    return f"{day} {month_full} {year} г."
+
+
+def replace_day_month_year(match):
+    day, month, year = match.group('word_day', 'word_month', 'word_year')
+    if not is_valid_date(int(day), MONTH_NUMBERS[month], int(year)):
+        return match.group()
+    return f"{day} {month} {year} г."
+
+
+# Все виды дат в одном выражении: каждая альтернатива — именованная группа,
+# по имени сработавшей группы выбирается функция замены из DATE_REPLACEMENTS.
+# Альтернативы перечислены в прежнем порядке применения шаблонов.
+DATE_RE = re.compile(
+    r'\b(?:'
+    r'(?P<dmy>(?P<dmy_day>\d{1,2})[./-](?P<dmy_month>\d{1,2})[./-](?P<dmy_year>\d{2,4}))\b'
+    r'|(?P<ymd>(?P<ymd_year>\d{4})[./-](?P<ymd_month>\d{1,2})[./-](?P<ymd_day>\d{1,2}))\b'
+    rf'|(?P<abbr>(?P<abbr_day>\d{{1,2}})\s+(?P<abbr_month>{MONTH_ABBREVIATIONS_PATTERN})[.]\s*(?P<abbr_year>\d{{4}}))\b'
+    rf'|(?P<word>(?P<word_day>\d{{1,2}})\s+(?P<word_month>{MONTH_NAMES_PATTERN})\s+(?P<word_year>\d{{4}})'
+    r'(?:\s+г\.\b|\b(?!\s*г)))'
+    r')'
+)
+
+DATE_REPLACEMENTS = {
+    'dmy': replace_dd_mm_yyyy,
+    'ymd': replace_yyyy_mm_dd,
+    'abbr': replace_day_month_abbr_year,
+    'word': replace_day_month_year,
+}
+
+
+def replace_date(match):
+    return DATE_REPLACEMENTS[match.lastgroup](match)
+
+
+@RULES.register('dates', order=30, version=2, requires=r'\d', title="Нормализация дат")
+def normalize_dates_in_text(text):
+    """
+    Преобразует даты в тексте к формату "12 марта 2024 г." за один проход.
+    Несуществующие даты (например, 45.13.2024) не изменяются.
+    """
+    return counted_sub(DATE_RE, replace_date, text)
+
+
+def normalize_dates(doc, paragraphs=None, edits='rebuild'):
+    """
+    Нормализует даты во всем документе
+    """
+    if paragraphs is None:
+        paragraphs = collect_document_paragraphs(doc)
+    try:
+        with STATS.stage('normalize_dates'):
+            STATS.count(paragraphs_visited=len(paragraphs))
+            for paragraph, _ in paragraphs:
+                normalize_paragraph_dates(paragraph, edits)
+        echo("✅ Даты нормализованы")
+        return True
+    except Exception as e:
+        echo(f"❌ Ошибка при нормализации дат: {e}")
+        return False
+
+
+def normalize_paragraph_dates(paragraph, edits='rebuild'):
+    """
+    Нормализует даты в параграфе
+    """
+    # Собираем весь текст параграфа
+    full_text = ''.join([run.text for run in paragraph.runs])
+    if not full_text.strip():
+        return
+    # Нормализуем даты в тексте
+    normalized_text, replacements = RULES.get('dates').apply(full_text)
+    # Если текст изменился, обновляем параграф
+    if normalized_text != full_text:
+        record_paragraph_change('dates', replacements)
+        if edits == 'splice':
+            splice_run_text([run._r for run in paragraph.runs], full_text, normalized_text)
+            return
+        # Сохраняем форматирование первого run для применения к новому тексту
+        first_run_format = {}
+        if paragraph.runs:
+            first_run = paragraph.runs[0]
+            first_run_format = {
+                'font_name': first_run.font.name,
+                'font_size': first_run.font.size,
+                'bold': first_run.bold,
+                'italic': first_run.italic,
+                'underline': first_run.underline
+            }
+        # Очищаем параграф и добавляем нормализованный текст
+        paragraph.clear()
+        run = paragraph.add_run(normalized_text)
+        STATS.count(runs_created=1)
+        # Применяем базовое форматирование
+        if first_run_format.get('font_name', 'Times New Roman') is not None:
+            run.font.name = first_run_format.get('font_name', 'Times New Roman')
+        if first_run_format.get('font_size', Pt(14)) is not None:
+            run.font.size = first_run_format.get('font_size', Pt(14))
+        if first_run_format.get('bold') is not None:
+            run.bold = first_run_format.get('bold')
+        if first_run_format.get('italic') is not None:
+            run.italic = first_run_format.get('italic')
+        if first_run_format.get('underline') is not None:
+            run.underline = first_run_format.get('underline')
+
+
+DATE_PATTERNS = [
+    re.compile(r'\d{1,2}[./-]\d{1,2}[./-]\d{2,4}', re.IGNORECASE),
+    re.compile(r'\d{4}[./-]\d{1,2}[./-]\d{1,2}', re.IGNORECASE),
+    re.compile(r'\d{1,2}\s+(января|февраля|марта|апреля|мая|июня|июля|августа|сентября|октября|ноября|декабря)\s+\d{4}',
+               re.IGNORECASE),
+    re.compile(
+        r'\d{1,2}\s+(января|февраля|марта|апреля|мая|июня|июля|августа|сентября|октября|ноября|декабря)\s+\d{4}\s*г\.?',
+        re.IGNORECASE),
+    re.compile(r'\d{1,2}\s+(янв|фев|мар|апр|май|июн|июл|авг|сен|окт|ноя|дек)[.]\s*\d{4}', re.IGNORECASE),
+]
+
+
+MONTH_WORD_PATTERNS = [
+    re.compile(r'\d+\s+(января|февраля|марта|апреля|мая|июня|июля|августа|сентября|октября|ноября|декабря)'),
+    re.compile(r'\d+\s+(янв|фев|мар|апр|май|июн|июл|авг|сен|окт|ноя|дек)[.]'),
+]
+
+
+# Слово "год" или "г." сразу после числа
+YEAR_WORD_AFTER_NUMBER_RE = re.compile(r'\s+год\b|\s*г\.')
+WORD_BOUNDARY_RE = re.compile(r'\b')
+
+
+# Шаблоны чисел для выделения жирным
+NUMBER_PATTERNS = [
+    re.compile(r'[+-]?\d{1,3}(?:\s\d{3})*(?:[.,]\d+)?'),
+    re.compile(r'[+-]?\d{1,3}(?:\u2009\d{3})*(?:[.,]\d+)?'),
+    re.compile(r'[+-]?\d{1,3}(?:,\d{3})*(?:[.,]\d+)?'),
+    re.compile(r'[+-]?\d{1,3}(?:\.\d{3})*(?:[.,]\d+)?'),
+    re.compile(r'[+-]?\d+(?:[.,]\d+)?'),
+]
+
+
+def make_numbers_bold(doc, paragraphs=None, edits='rebuild', formatting='direct'):
+    """
+    Выделяет жирным все числа (кроме дат и чисел с "год" и "г."), но не выделяет числа в составе номеров (№ А3233 344/2 025)
+    """
+    if paragraphs is None:
+        paragraphs = collect_document_paragraphs(doc)
+    try:
+        with STATS.stage('make_numbers_bold'):
+            STATS.count(paragraphs_visited=len(paragraphs))
+            for paragraph, _ in paragraphs:
+                process_paragraph_numbers(paragraph, NUMBER_PATTERNS, edits, formatting)
+        echo("✅ Числа выделены жирным (даты, 'год' и номера дел исключены)")
+        return True
+    except Exception as e:
+        echo(f"❌ Ошибка при выделении чисел: {e}")
+        return False
+
+
+# Даты, названия месяцев и номера документов: числа в них не выделяются жирным и не переформатируются
+NUMBER_EXCLUSION_PATTERNS = DATE_PATTERNS + MONTH_WORD_PATTERNS + DOCUMENT_NUMBER_PATTERNS
+
+
+def lower_preserving_positions(text):
+    """
+    Текст в нижнем регистре той же длины, что исходный
+    """
+    text_lower = text.lower()
+    if len(text_lower) != len(text):
+        # Некоторые символы при переводе в нижний регистр удлиняются — сохраняем позиции
+        text_lower = ''.join([ch.lower()[0] for ch in text])
+    return text_lower
+
+
+class NumberSpanIndex:
+    """
+    Индекс фрагментов параграфа, рядом с которыми числа не выделяются жирным.
+    Строится один раз на параграф: по одному проходу каждого шаблона дат,
+    названий месяцев, номеров документов и слов "год"/"г.".
+    Проверка числа сводится к поиску по интервалам вместо повторных регулярных выражений.
+    """
+
+    # Размер контекста вокруг числа, в котором ищутся исключения
+    CONTEXT = 50
+
+    def __init__(self, full_text):
+        text_lower = lower_preserving_positions(full_text)
+        self.text_lower = text_lower
+        self.length = len(text_lower)
+
+        spans = []
+        for pattern in NUMBER_EXCLUSION_PATTERNS:
+            match = pattern.search(text_lower)
+            while match:
+                spans.append((match.start(), match.end()))
+                match = pattern.search(text_lower, match.start() + 1)
+        spans.sort()
+        self.starts = [start for start, end in spans]
+        self.ends = [end for start, end in spans]
+        # Минимальный конец среди фрагментов, начинающихся не раньше i-го
+        self.min_ends = self.ends[:]
+        for i in range(len(spans) - 2, -1, -1):
+            if self.min_ends[i + 1] < self.min_ends[i]:
+                self.min_ends[i] = self.min_ends[i + 1]
+        # Максимальный конец среди фрагментов, начинающихся раньше i-го (для i = 0 — -1)
+        self.max_ends = [-1] + list(itertools.accumulate(self.ends, max))
+
+        year_words = YEAR_WORD_AFTER_NUMBER_RE.finditer(text_lower)
+        self.year_words = [(match.start(), match.end()) for match in year_words]
+        self.year_starts = [start for start, end in self.year_words]
+
+    def extends_beyond(self, start, end):
+        """
+        Проверяет, входит ли фрагмент [start, end) в более длинную дату, название месяца
+        или номер документа — найденный шаблоном фрагмент, выходящий за его границы
+        """
+        i = bisect.bisect_left(self.starts, start)
+        if self.max_ends[i] > start:
+            return True
+        while i < len(self.starts) and self.starts[i] < end:
+            if self.ends[i] > end:
+                return True
+            i += 1
+        return False
+
+    def excludes(self, start, end, number_text):
+        """
+        Проверяет, нужно ли пропустить число: в его контексте есть дата, название месяца,
+        номер документа или это же число со словом "год"/"г."
+        """
+        context_start = max(0, start - self.CONTEXT)
+        context_end = min(self.length, end + self.CONTEXT)
+
+        i = bisect.bisect_left(self.starts, context_start)
+        if i < len(self.starts) and self.min_ends[i] <= context_end:
+            return True
+
+        size = len(number_text)
+        i = bisect.bisect_left(self.year_starts, context_start + size)
+        while i < len(self.year_words):
+            year_start, year_end = self.year_words[i]
+            if year_end > context_end:
+                break
+            number_start = year_start - size
+            if (self.text_lower.startswith(number_text, number_start) and
+                    WORD_BOUNDARY_RE.match(self.text_lower, number_start)):
+                return True
+            i += 1
+        return False
+
+
+@RULES.register('bold_numbers', order=80, version=2, kind='spans', requires=r'\d',
+                title="Выделение чисел жирным (даты, 'год' и номера дел исключены)")
+def find_number_spans(full_text, number_patterns=NUMBER_PATTERNS):
+    """
+    Находит числа для выделения жирным (без дат, чисел с "год"/"г." и номеров дел).
+    Возвращает список непересекающихся совпадений, отсортированных по позиции.
+    """
+    index = NumberSpanIndex(full_text)
+    numbers_found = []
+    for pattern in number_patterns:
+        for match in pattern.finditer(full_text):
+            number_text = match.group()
+            start_pos = match.start()
+            end_pos = match.end()
+            if index.excludes(start_pos, end_pos, number_text):
+                continue  # Пропускаем
+
+            numbers_found.append({
+                'text': number_text,
+                'start': start_pos,
+                'end': end_pos
+            })
+
+    # Удаление пересекающихся совпадений: принятые числа не пересекаются и идут
+    # по порядку, поэтому достаточно сравнить с концом последнего принятого
+    if numbers_found:
+        numbers_found.sort(key=lambda x: x['start'])
+        filtered = []
+        last_end = -1
+        for num in numbers_found:
+            if num['start'] >= last_end:
+                filtered.append(num)
+                last_end = num['end']
+        numbers_found = filtered
+    return numbers_found
+
+
+def rebuild_paragraph_with_numbers(paragraph, full_text, number_spans, font):
+    """
+    Перестраивает параграф: числа выделяются жирным, остальной текст — обычный.
+    number_spans — границы чисел (начало, конец) по возрастанию.
+    font — (имя, размер) новых run; None — шрифт и размер берутся из стилей.
+    Возвращает число созданных run.
+    """
+    paragraph.clear()
+    last_pos = 0
+    for start, end in number_spans:
+        if start > last_pos:
+            before = full_text[last_pos:start]
+            run = paragraph.add_run(before)
+            if font is not None:
+                run.font.name, run.font.size = font
+            run.bold = False
+        bold_run = paragraph.add_run(full_text[start:end])
+        bold_run.bold = True
+        if font is not None:
+            bold_run.font.name, bold_run.font.size = font
+        last_pos = end
+    if last_pos < len(full_text):
+        after = full_text[last_pos:]
+        run = paragraph.add_run(after)
+        if font is not None:
+            run.font.name, run.font.size = font
+        run.bold = False
+    return len(paragraph.runs)
+
+
+def process_paragraph_numbers(paragraph, number_patterns, edits='rebuild', formatting='direct'):
+    """
+    Обрабатывает числа в параграфе
+    """
+    runs_text = [run.text for run in paragraph.runs]
+    full_text = ''.join(runs_text)
+    if not full_text.strip():
+        return
+
+    start = time.perf_counter()
+    numbers_found = find_number_spans(full_text, number_patterns)
+    STATS.time_rule('bold_numbers', time.perf_counter() - start)
+    if not numbers_found:
+        return
+    number_spans = [(num['start'], num['end']) for num in numbers_found]
+    if edits == 'splice':
+        runs_created = apply_number_bold(paragraph._p, number_spans)
+    else:
+        runs_created = rebuild_paragraph_with_numbers(
+            paragraph, full_text, number_spans, DEFAULT_PLAN.run_font(formatting))
+    record_paragraph_change('bold_numbers', len(number_spans), runs_created)
+
+
+def reset_text_formatting_except_bold(doc, paragraphs=None, formatting='direct'):
+    """
+    Сбрасывает все форматирование текста, кроме жирного выделения.
+    При formatting='styles' прямые свойства run удаляются целиком (см. strip_run_element).
+    """
+    if paragraphs is None:
+        paragraphs = collect_document_paragraphs(doc)
+    try:
+        with STATS.stage('reset_text_formatting_except_bold'):
+            STATS.count(paragraphs_visited=len(paragraphs))
+            for paragraph, _ in paragraphs:
+                runs = paragraph.runs
+                if runs:
+                    STATS.count(paragraphs_changed=1)
+                if formatting == 'styles':
+                    for run in runs:
+                        strip_run_element(run._r)
+                    continue
+                for run in runs:
+                    is_bold = run.bold
+                    run.font.name = None
+                    run.font.size = None
+                    run.font.bold = None
+                    run.font.italic = None
+                    run.font.underline = None
+                    run.font.color.rgb = None
+                    if is_bold is not None:
+                        run.bold = is_bold
+        echo("✅ Форматирование текста сброшено (сохранено только жирное выделение)")
+        return True
+    except Exception as e:
+        echo(f"❌ Ошибка при сбросе форматирования: {e}")
+        return False
+
+
+def apply_uniform_formatting(doc, paragraphs=None, formatting='direct'):
+    """
+    Применяет единый стиль ко всему документу.
+    При formatting='styles' шрифт и размер задаются стилями, а не каждому run.
+    """
+    if paragraphs is None:
+        paragraphs = collect_document_paragraphs(doc)
+    try:
+        with STATS.stage('apply_uniform_formatting'):
+            STATS.count(paragraphs_visited=len(paragraphs))
+            if formatting == 'styles':
+                apply_style_formatting(doc.styles.element)
+            for paragraph, in_table in paragraphs:
+                # Изменённым считается параграф, у которого хотя бы одно значение отличалось от единого стиля
+                changed = False
+                if formatting == 'direct':
+                    for run in paragraph.runs:
+                        font = run.font
+                        if font.name != 'Times New Roman' or font.size != Pt(14):
+                            changed = True
+                        font.name = 'Times New Roman'
+                        font.size = Pt(14)
+                pf = paragraph.paragraph_format
+                if formatting == 'styles':
+                    # Межстрочный интервал задан в стилях (apply_style_formatting)
+                    if remove_line_spacing(paragraph._p.pPr):
+                        changed = True
+                else:
+                    if pf.line_spacing != 1.5:
+                        changed = True
+                    pf.line_spacing = 1.5
+                # Интервалы до и после обнуляются только вне таблиц
+                if not in_table:
+                    if pf.space_before != Pt(0) or pf.space_after != Pt(0):
+                        changed = True
+                    pf.space_before = Pt(0)
+                    pf.space_after = Pt(0)
+                if changed:
+                    STATS.count(paragraphs_changed=1)
+        echo("✅ Установлен единый стиль: Times New Roman, 14pt, интервал 1.5")
+        return True
+    except Exception as e:
+        echo(f"❌ Ошибка при применении единого стиля: {e}")
+        return False
+
+
+# Число: цифры, возможно разделённые точками или запятыми (12,5; 1.000.000; 192.168.1.1),
+# и знак процента сразу после него
+NUMBER_TOKEN_RE = re.compile(r'(?<!\d)(?P<number>\d+(?:[.,]\d+)*)(?P<percent>%)?')
+NUMBER_SEPARATOR_RE = re.compile(r'[.,]')
+WORD_CHAR_RE = re.compile(r'\w')
+# Число разрядов, начиная с которого целая часть делится на группы по три цифры.
+# Четырёхзначные числа (в том числе годы) не делятся.
+THOUSANDS_MIN_DIGITS = 5
+# Реквизиты перед числом (ИНН 0106002128, р/с 40702810...): такие числа — идентификаторы
+REQUISITE_BEFORE_NUMBER_RE = re.compile(
+    r'(?:инн|кпп|огрнип|огрн|бик|окпо|октмо|окато|снилс|р/с|к/с|л/с|сч[её]т|тел\.?|телефон)\s*[:№]?\s*$')
+REQUISITE_CONTEXT = 20
+# Условие изменения текста: десятичная точка, процент без пробела или длинное число
+NUMBERS_PREFILTER = rf'\d(?:\.\d|%|\d{{{THOUSANDS_MIN_DIGITS - 1}}})'
+
+
+def group_thousands(digits):
+    """
+    Делит целую часть на группы по три цифры: 2500000 -> 2 500 000
+    """
+    head = len(digits) % 3 or 3
+    return ' '.join([digits[:head]] + [digits[i:i + 3] for i in range(head, len(digits), 3)])
+
+
+def is_identifier(text_lower, start, digits):
+    """
+    Проверяет, что длинное число — идентификатор, а не количество: начинается с нуля
+    или стоит после названия реквизита (ИНН, ОГРН, р/с и т. п.)
+    """
+    if digits.startswith('0'):
+        return True
+    return REQUISITE_BEFORE_NUMBER_RE.search(text_lower, max(0, start - REQUISITE_CONTEXT), start) is not None
+
+
+@RULES.register('numbers', order=40, requires=NUMBERS_PREFILTER,
+                title="Числа: десятичная запятая, пробел перед %, разделители тысяч "
+                      "(10 000; годы и номера документов не меняются)")
+def format_numbers_in_text(text):
+    """
+    Приводит числа к принятой записи за один проход: десятичная точка заменяется запятой,
+    целая часть длинных чисел делится пробелами на группы по три цифры, перед знаком
+    процента ставится пробел. Пример: 12345.67 -> 12 345,67, 12.5% -> 12,5 %.
+    Числа из трёх и более частей (1.000.000, 192.168.1.1), числа внутри слов, а также
+    входящие в дату, номер документа или стоящие перед "год"/"г." не меняются —
+    по тем же шаблонам, что исключают числа из выделения жирным. Идентификаторы
+    (ИНН, счета, числа с ведущим нулём) не делятся на группы.
+    """
+    index = None
+
+    def replace_number(match):
+        nonlocal index
+        number = match.group('number')
+        start, end = match.span('number')
+        parts = NUMBER_SEPARATOR_RE.split(number)
+        if (len(parts) <= 2 and (len(parts[0]) >= THOUSANDS_MIN_DIGITS or '.' in number) and
+                not (start and WORD_CHAR_RE.match(text, start - 1)) and not WORD_CHAR_RE.match(text, end)):
+            # Индекс исключений строится, только если в параграфе есть число, которое нужно изменить
+            if index is None:
+                index = NumberSpanIndex(text)
+            if not (index.extends_beyond(start, end) or YEAR_WORD_AFTER_NUMBER_RE.match(index.text_lower, end)):
+                if len(parts[0]) >= THOUSANDS_MIN_DIGITS and not is_identifier(index.text_lower, start, parts[0]):
+                    parts[0] = group_thousands(parts[0])
+                number = ','.join(parts)
+        if match.group('percent'):
+            number += ' %'
+        return number
+
+    return counted_sub(NUMBER_TOKEN_RE, replace_number, text)
+
+
+def format_numbers(doc, paragraphs=None, edits='rebuild'):
+    """
+    Приводит к принятой записи все числа документа: десятичные разделители,
+    разделители тысяч и пробелы перед знаком процента
+    """
+    if paragraphs is None:
+        paragraphs = collect_document_paragraphs(doc)
+    try:
+        with STATS.stage('format_numbers'):
+            STATS.count(paragraphs_visited=len(paragraphs))
+            for paragraph, _ in paragraphs:
+                format_paragraph_numbers(paragraph, edits)
+        echo("✅ Числа отформатированы (десятичная запятая, разделители тысяч, пробел перед %)")
+        return True
+    except Exception as e:
+        echo(f"❌ Ошибка при форматировании чисел: {e}")
+        return False
+
+
+def format_paragraph_numbers(paragraph, edits='rebuild'):
+    """
+    Приводит к принятой записи числа в параграфе
+    """
+    # Собираем весь текст параграфа
+    full_text = ''.join([run.text for run in paragraph.runs])
+    if not full_text.strip():
+        return
+
+    # Форматируем числа
+    formatted_text, replacements = RULES.get('numbers').apply(full_text)
+
+    # Если текст изменился, обновляем параграф
+    if formatted_text != full_text:
+        record_paragraph_change('numbers', replacements)
+        if edits == 'splice':
+            splice_run_text([run._r for run in paragraph.runs], full_text, formatted_text)
+            return
+        # Сохраняем форматирование первого run
+        first_run_format = {}
+        if paragraph.runs:
+            first_run = paragraph.runs[0]
+            first_run_format = {
+                'font_name': first_run.font.name,
+                'font_size': first_run.font.size,
+                'bold': first_run.bold,
+                'italic': first_run.italic,
+                'underline': first_run.underline
+            }
+
+        # Очищаем параграф и добавляем отформатированный текст
+        paragraph.clear()
+        run = paragraph.add_run(formatted_text)
+        STATS.count(runs_created=1)
+
+        # Восстанавливаем форматирование
+        if first_run_format.get('font_name', 'Times New Roman') is not None:
+            run.font.name = first_run_format.get('font_name', 'Times New Roman')
+        if first_run_format.get('font_size', Pt(14)) is not None:
+            run.font.size = first_run_format.get('font_size', Pt(14))
+        if first_run_format.get('bold') is not None:
+            run.bold = first_run_format.get('bold')
+        if first_run_format.get('italic') is not None:
+            run.italic = first_run_format.get('italic')
+        if first_run_format.get('underline') is not None:
+            run.underline = first_run_format.get('underline')
+
+
+# Цепочка текстовых преобразований в порядке применения
+TEXT_TRANSFORMS = RULES.ordered()
+NUMBER_SPANS_RULE = RULES.get('bold_numbers')
+
+# Параметры обработки по умолчанию
+DEFAULT_OPTIONS = {
+    # 'fused' — один проход по параграфам, 'staged' — отдельный проход на каждый этап
+    'pipeline': 'fused',
+    # 'docx' — через объекты python-docx, 'lxml' — напрямую над XML (только для 'fused')
+    'engine': 'docx',
+    # 'rebuild' — параграф с изменённым текстом собирается заново одним run,
+    # 'splice' — изменения текста переносятся на существующие run с сохранением их содержимого
+    'edits': 'rebuild',
+    # Каталог кэша результатов (None — кэш отключён) и его предельный размер
+    'cache_dir': None,
+    'cache_max_bytes': 1024 * 1024 * 1024,
+    # Число запомненных результатов обработки параграфов (повторяющиеся ячейки и шаблонные строки)
+    'paragraph_cache_size': 4096,
+    # 'zip' — переписываются только изменённые XML-части, остальные записи архива копируются как есть;
+    # 'docx' — документ целиком пересохраняется через python-docx
+    'writer': 'zip',
+    # Уровень сжатия переписываемых частей (0–9)
+    'compress_level': 6,
+    # Функция, которой передаётся отчёт ProcessingStats.report() после обработки документа
+    'stats_callback': None,
+    # Каталог для результатов (None — рядом с исходным файлом)
+    'output_dir': None,
+    # 'direct' — шрифт и размер записываются в каждый run, 'styles' — один раз в docDefaults
+    # и стиль Normal, а у run остаются только жирность, стиль символов и индексы
+    'formatting': 'direct',
+    # Объединять соседние run с одинаковыми свойствами после обработки параграфа
+    'coalesce_runs': True,
+    # Число процессов для разбора текста параграфов внутри одного документа (0 — последовательно)
+    'analysis_workers': 0,
+    # Профиль правил (см. normalize_profile): None — все правила и параметры по умолчанию
+    'profile': None,
+}
+
+
+def options_error(options):
+    """
+    Проверяет, что параметры обработки совместимы друг с другом (недостающие берутся из DEFAULT_OPTIONS).
+    Возвращает сообщение об ошибке или None
+    """
+    options = {**DEFAULT_OPTIONS, **options}
+    if options['engine'] == 'stream' and options['writer'] == 'docx':
+        return ("writer=docx несовместим с engine=stream: потоковый движок переписывает "
+                "только изменённые части архива")
+    return None
+
+# Версия этапов вне реестра правил (поля, сброс и единый стиль, выравнивание).
+# Увеличивается при любом изменении результата этих этапов, чтобы кэш не выдавал устаревшие файлы.
+FORMAT_VERSION = 3
+
+# Параметры, не влияющие на содержимое результата
+CACHE_NEUTRAL_OPTIONS = {
+    'pipeline', 'engine', 'cache_dir', 'cache_max_bytes', 'paragraph_cache_size', 'writer', 'compress_level',
+    'stats_callback', 'output_dir', 'analysis_workers',
+}
+
+
+# ---------------------------------------------------------------------------
+# Профили правил (--profile): какие правила выполнять и в каком порядке, поля, шрифт,
+# интервалы и выравнивание. Профиль читается из JSON или TOML и компилируется в план
+# выполнения ExecutionPlan, по которому работают однопроходные движки и режим проверки.
+
+class ProfileError(ValueError):
+    """
+    Профиль правил содержит ошибку
+    """
+
+
+MARGIN_SIDES = ('top', 'right', 'bottom', 'left')
+MARGIN_TITLES = {'top': 'Верх', 'right': 'Право', 'bottom': 'Низ', 'left': 'Лево'}
+
+# Профиль по умолчанию: все правила в порядке реестра. Поля задаются в сантиметрах,
+# размер шрифта и интервалы до и после параграфа — в пунктах, line — множитель межстрочного интервала
+DEFAULT_PROFILE = {
+    'rules': [rule.name for rule in TEXT_TRANSFORMS] + [NUMBER_SPANS_RULE.name],
+    'margins': {'top': 1.0, 'right': 1.5, 'bottom': 1.0, 'left': 1.5},
+    'font': {'name': 'Times New Roman', 'size': 14.0},
+    'spacing': {'line': 1.5, 'before': 0.0, 'after': 0.0},
+    'justify': True,
+}
+
+# Параметры, для которых ноль не имеет смысла: кегль и междустрочный интервал
+PROFILE_POSITIVE_PARAMS = {('font', 'size'), ('spacing', 'line')}
+
+
+def normalize_profile_section(key, value):
+    """
+    Параметры этапа margins, font или spacing: недостающие берутся из DEFAULT_PROFILE.
+    false (или null) отключает этап — возвращается None. Кегль и междустрочный интервал
+    должны быть больше нуля, отступы и поля — не меньше нуля.
+    """
+    if value is False or value is None:
+        return None
+    if not isinstance(value, dict):
+        raise ProfileError(f"{key}: ожидается объект с параметрами или false")
+    defaults = DEFAULT_PROFILE[key]
+    unknown = sorted(set(value) - set(defaults))
+    if unknown:
+        raise ProfileError(f"{key}: неизвестные параметры: {', '.join(unknown)}")
+    section = {}
+    for name, default in defaults.items():
+        item = value.get(name, default)
+        if isinstance(default, str):
+            if not isinstance(item, str) or not item.strip():
+                raise ProfileError(f"{key}.{name}: ожидается непустая строка")
+        elif isinstance(item, bool) or not isinstance(item, (int, float)):
+            raise ProfileError(f"{key}.{name}: ожидается число, получено {item!r}")
+        elif (key, name) in PROFILE_POSITIVE_PARAMS and item <= 0:
+            raise ProfileError(f"{key}.{name}: ожидается положительное число, получено {item!r}")
+        elif item < 0:
+            raise ProfileError(f"{key}.{name}: ожидается неотрицательное число, получено {item!r}")
+        else:
+            item = float(item)
+        section[name] = item
+    return section
+
+
+def normalize_profile(profile=None):
+    """
+    Проверяет профиль и дополняет его значениями по умолчанию.
+    rules — включённые правила в порядке применения (выделение чисел всегда выполняется
+    после текстовых правил), disabled — правила, которые исключаются из rules;
+    margins, font и spacing — объекты с частью параметров или false, если этап не нужен;
+    justify — выравнивание по ширине. Без шрифта не выполняется и сброс форматирования run.
+    """
+    if profile is None:
+        profile = {}
+    if not isinstance(profile, dict):
+        raise ProfileError("профиль должен быть объектом (таблицей TOML)")
+    unknown = sorted(set(profile) - set(DEFAULT_PROFILE) - {'disabled'})
+    if unknown:
+        raise ProfileError(f"неизвестные ключи: {', '.join(unknown)}")
+    rules = profile.get('rules', DEFAULT_PROFILE['rules'])
+    disabled = profile.get('disabled', [])
+    for key, names in (('rules', rules), ('disabled', disabled)):
+        if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+            raise ProfileError(f"{key}: ожидается список названий правил")
+        unknown = [name for name in names if name not in RULES]
+        if unknown:
+            raise ProfileError(f"{key}: неизвестные правила: {', '.join(unknown)}; "
+                               f"доступны: {', '.join(DEFAULT_PROFILE['rules'])}")
+    if len(set(rules)) < len(rules):
+        raise ProfileError("rules: правило указано несколько раз")
+    normalized = {'rules': [name for name in rules if name not in disabled]}
+    for key in ('margins', 'font', 'spacing'):
+        normalized[key] = normalize_profile_section(key, profile.get(key, {}))
+    justify = profile.get('justify', DEFAULT_PROFILE['justify'])
+    if not isinstance(justify, bool):
+        raise ProfileError("justify: ожидается true или false")
+    normalized['justify'] = justify
+    return normalized
+
+
+class ExecutionPlan:
+    """
+    План выполнения, скомпилированный из проверенного профиля. Отключённые этапы в план
+    не попадают: text_rules — только включённые текстовые правила в порядке профиля,
+    все они применяются к тексту параграфа за один проход; spans_rule — выделение чисел
+    или None; prefilter — объединённое условие только включённых правил.
+    margins, font и spacing переведены в единицы python-docx, None — этап не выполняется.
+    Планы с одинаковым профилем равны, поэтому кэш параграфов общий для всех документов.
+    """
+
+    def __init__(self, profile):
+        self.profile = profile
+        rules = [RULES.get(name) for name in profile['rules']]
+        self.text_rules = tuple(rule for rule in rules if rule.kind == 'text')
+        self.spans_rule = next((rule for rule in rules if rule.kind == 'spans'), None)
+        self.prefilter = RULES.prefilter(rules) if rules else None
+        self.analyzes_text = bool(rules)
+        margins, font, spacing = profile['margins'], profile['font'], profile['spacing']
+        # Поля секций в порядке MARGIN_SIDES, как section.top_margin = Cm(...) и т.д.
+        self.margins = tuple((side, Cm(margins[side])) for side in MARGIN_SIDES) if margins else None
+        # Шрифт run: имя и размер, как run.font.name и run.font.size
+        self.font = (font['name'], Pt(font['size'])) if font else None
+        self.spacing = self.spacing_attrs = None
+        if spacing:
+            self.spacing = (spacing['line'], Pt(spacing['before']), Pt(spacing['after']))
+            # Значения атрибутов w:spacing, которые python-docx записывает для line_spacing,
+            # space_before и space_after (множитель интервала — в долях 240 твипов)
+            line, before, after = self.spacing
+            self.spacing_attrs = (str(Emu(line * Twips(240)).twips), str(before.twips), str(after.twips))
+        self.justify = profile['justify']
+        # Параграфы не обходятся вовсе, если план не меняет ни их текст, ни оформление
+        self.formats_paragraphs = self.analyzes_text or bool(font or spacing or self.justify)
+        self.key = json.dumps(profile, sort_keys=True, ensure_ascii=False)
+        self._hash = hash(self.key)
+
+    def __eq__(self, other):
+        return isinstance(other, ExecutionPlan) and self.key == other.key
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        # В рабочие процессы передаётся профиль, а план компилируется там заново
+        return ExecutionPlan, (self.profile,)
+
+    def __repr__(self):
+        return f"ExecutionPlan({self.key})"
+
+    def run_font(self, formatting):
+        """
+        Шрифт, который записывается в каждый run: None, если его задают стили или шрифт отключён
+        """
+        return self.font if formatting == 'direct' else None
+
+    def modifies_styles(self, formatting):
+        """
+        Меняет ли план стили документа (styles.xml) при данном способе форматирования
+        """
+        return formatting == 'styles' and (self.font is not None or self.spacing is not None)
+
+    def steps(self):
+        """
+        Выполняемые действия в порядке выполнения — для вывода перед обработкой
+        """
+        steps = []
+        if self.margins:
+            margins = self.profile['margins']
+            steps.append("Установка полей: " + ", ".join(
+                f"{MARGIN_TITLES[side]}={margins[side]:g}см" for side in MARGIN_SIDES))
+        style = []
+        if self.font:
+            steps.append("Сброс форматирования (сохранено только жирное выделение)")
+            font = self.profile['font']
+            style.append(f"{font['name']}, {font['size']:g}pt")
+        if self.spacing:
+            style.append(f"интервал {self.profile['spacing']['line']:g}")
+        if style:
+            steps.append(f"Установка стиля: {', '.join(style)}")
+        steps.extend(rule.title for rule in self.text_rules)
+        if self.spans_rule is not None:
+            steps.append(self.spans_rule.title)
+        if self.justify:
+            steps.append("Выравнивание по ширине")
+        return steps
+
+
+def compile_profile(profile=None):
+    """
+    Компилирует профиль (None — профиль по умолчанию) в план выполнения.
+    При ошибке в профиле возбуждается ProfileError.
+    """
+    return ExecutionPlan(normalize_profile(profile))
+
+
+def load_profile(path):
+    """
+    Читает профиль из TOML-файла (расширение .toml) или JSON-файла и проверяет его.
+    Возвращает профиль, дополненный значениями по умолчанию.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if path.lower().endswith('.toml'):
+        if tomllib is None:
+            raise ProfileError("для профилей TOML нужен Python 3.11 или новее, используйте JSON")
+        profile = tomllib.loads(data.decode('utf-8'))
+    else:
+        profile = json.loads(data)
+    return normalize_profile(profile)
+
+
+DEFAULT_PLAN = compile_profile()
+
+
+def transform_paragraph_text(full_text, rules=TEXT_TRANSFORMS):
+    """
+    Применяет цепочку текстовых преобразований (по умолчанию всю) к тексту параграфа.
+    Возвращает итоговый текст, признак того, что хотя бы один этап изменил текст,
+    и кортеж (правило, число замен) для сработавших правил.
+    """
+    changed = False
+    replacements = []
+    for transform in rules:
+        if not transform.accepts(full_text):
+            continue
+        new_text, count = transform.apply(full_text)
+        if new_text != full_text:
+            changed = True
+            full_text = new_text
+            replacements.append((transform.name, count))
+    return full_text, changed, tuple(replacements)
+
+
+def analyze_paragraph_text(full_text, plan=DEFAULT_PLAN):
+    """
+    Обработка текста параграфа по плану: цепочка преобразований и поиск чисел для выделения.
+    Возвращает итоговый текст, признак изменения, кортеж границ чисел (начало, конец)
+    и кортеж (правило, число замен) для сработавших правил.
+    """
+    if not plan.analyzes_text or not full_text.strip():
+        return full_text, False, (), ()
+    # Параграф, в котором нет ни одного кандидата для правил плана, не обрабатывается вовсе
+    if plan.prefilter is not None and not plan.prefilter.search(full_text):
+        return full_text, False, (), ()
+    new_text, changed, replacements = transform_paragraph_text(full_text, plan.text_rules)
+    number_spans = ()
+    if plan.spans_rule is not None and new_text.strip() and plan.spans_rule.accepts(new_text):
+        number_spans = tuple((num['start'], num['end']) for num in plan.spans_rule.find(new_text))
+    return new_text, changed, number_spans, replacements
+
+
+# Ограниченный LRU-кэш результатов по тексту параграфа и плану: одинаковые ячейки таблиц,
+# повторяющиеся заголовки и шаблонные строки обрабатываются один раз
+cached_analyze_paragraph_text = functools.lru_cache(
+    maxsize=DEFAULT_OPTIONS['paragraph_cache_size'])(analyze_paragraph_text)
+
+
+def configure_paragraph_cache(maxsize):
+    """
+    Задаёт размер кэша параграфов. При изменении размера кэш создаётся заново.
+    """
+    global cached_analyze_paragraph_text
+    if cached_analyze_paragraph_text.cache_parameters()['maxsize'] != maxsize:
+        cached_analyze_paragraph_text = functools.lru_cache(maxsize=maxsize)(analyze_paragraph_text)
+
+
+def paragraph_cache_info():
+    """
+    Счётчики кэша параграфов: hits, misses, maxsize, currsize
+    """
+    return cached_analyze_paragraph_text.cache_info()
+
+
+def record_paragraph_cache(before, after):
+    """
+    Учитывает в замерах документа попадания и промахи кэша параграфов между
+    двумя снимками paragraph_cache_info() и выводит их
+    """
+    hits, misses = after.hits - before.hits, after.misses - before.misses
+    STATS.document['paragraph_cache_hits'] = STATS.document.get('paragraph_cache_hits', 0) + hits
+    STATS.document['paragraph_cache_misses'] = STATS.document.get('paragraph_cache_misses', 0) + misses
+    echo(f"   Кэш параграфов: попаданий {hits}, промахов {misses}")
+
+
+# Разбор текста параграфов в пуле процессов для больших документов: с какого числа
+# параграфов он включается и сколько различных текстов передаётся процессу за раз
+PARALLEL_ANALYSIS_MIN_PARAGRAPHS = 2000
+PARALLEL_ANALYSIS_CHUNK_SIZE = 256
+
+
+def analyze_paragraph_texts(texts, plan=DEFAULT_PLAN):
+    """
+    Разбирает пачку текстов в рабочем процессе. Возвращает результаты и замеры правил,
+    которые основной процесс добавляет к своим
+    """
+    STATS.reset()
+    analyses = [analyze_paragraph_text(text, plan) for text in texts]
+    return analyses, STATS.rules
+
+
+def parallel_paragraph_analyses(paragraph_elements, workers, plan=DEFAULT_PLAN):
+    """
+    Разбирает тексты параграфов документа в пуле из workers процессов.
+    Тексты без кандидатов на замену разбираются на месте, одинаковые — один раз.
+    Возвращает результаты analyze_paragraph_text в порядке параграфов, как при
+    последовательной обработке, или None, если документ слишком мал для пула.
+    """
+    if not workers or workers < 2 or len(paragraph_elements) < PARALLEL_ANALYSIS_MIN_PARAGRAPHS \
+            or not plan.analyzes_text:
+        return None
+    with STATS.stage('parallel_paragraph_analyses'):
+        texts = [paragraph_element_text(p) for p in paragraph_elements]
+        results = {}
+        pending = []
+        for text in dict.fromkeys(texts):
+            if not text.strip() or (plan.prefilter is not None and not plan.prefilter.search(text)):
+                results[text] = (text, False, (), ())
+            else:
+                pending.append(text)
+        STATS.count(paragraphs_visited=len(pending))
+        chunks = [pending[i:i + PARALLEL_ANALYSIS_CHUNK_SIZE]
+                  for i in range(0, len(pending), PARALLEL_ANALYSIS_CHUNK_SIZE)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=ignore_interrupts) as executor:
+            # map сохраняет порядок пачек, поэтому результат не зависит от порядка завершения процессов
+            analyze = functools.partial(analyze_paragraph_texts, plan=plan)
+            for chunk, (analyses, rules) in zip(chunks, executor.map(analyze, chunks)):
+                results.update(zip(chunk, analyses))
+                STATS.merge_rules(rules)
+    echo(f"   Текст {len(pending)} параграфов разобран в {workers} процессах")
+    return [results[text] for text in texts]
+
+
+def process_paragraph_pipeline(paragraph, in_table=False, edits='rebuild', formatting='direct', analysis=None,
+                               plan=DEFAULT_PLAN):
+    """
+    Обрабатывает параграф за один проход: сброс и унификация форматирования,
+    текстовые преобразования и выделение чисел — те из них, что включены в план.
+    Runs параграфа перестраиваются не более одного раза.
+    analysis — готовый результат analyze_paragraph_text (при параллельном разборе).
+    """
+    runs = paragraph.runs
+    full_text = ''.join([run.text for run in runs])
+    if analysis is None:
+        analysis = cached_analyze_paragraph_text(full_text, plan)
+    new_text, changed, number_spans, replacements = analysis
+    font = plan.run_font(formatting)
+    runs_created = 0
+
+    if edits == 'splice':
+        if plan.font is not None:
+            for run in runs:
+                reset_run_formatting(run, font)
+        runs_created = splice_paragraph_element(
+            paragraph._p, [run._r for run in runs], full_text, new_text, number_spans)
+    elif number_spans:
+        runs_created = rebuild_paragraph_with_numbers(paragraph, new_text, number_spans, font)
+    elif changed:
+        # Текст изменился: один run с форматированием первого run (после сброса
+        # у него остаются только жирность, шрифт и размер из единого стиля)
+        first_bold = runs[0].bold
+        paragraph.clear()
+        run = paragraph.add_run(new_text)
+        if font is not None:
+            run.font.name, run.font.size = font
+        if first_bold is not None:
+            run.bold = first_bold
+        runs_created = 1
+    elif plan.font is not None:
+        for run in runs:
+            reset_run_formatting(run, font)
+    record_pipeline_changes(replacements, number_spans, runs_created)
+
+    if plan.spacing is not None:
+        line, before, after = plan.spacing
+        pf = paragraph.paragraph_format
+        if formatting == 'styles':
+            # Межстрочный интервал задан в стилях (apply_style_formatting)
+            remove_line_spacing(paragraph._p.pPr)
+        else:
+            pf.line_spacing = line
+        if not in_table:
+            pf.space_before = before
+            pf.space_after = after
+    if plan.justify:
+        paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+
+
+def record_pipeline_changes(replacements, number_spans, runs_created):
+    """
+    Учитывает в замерах результат однопроходной обработки параграфа
+    """
+    if not replacements and not number_spans:
+        return
+    total = sum(count for _, count in replacements) + len(number_spans)
+    STATS.count(paragraphs_changed=1, replacements=total, runs_created=runs_created)
+    for rule_name, count in replacements:
+        STATS.count_rule(rule_name, count)
+    if number_spans:
+        STATS.count_rule('bold_numbers', len(number_spans), runs_created)
+
+
+def reset_run_formatting(run, font):
+    """
+    Сброс форматирования run с сохранением жирности и установка единого шрифта font (имя, размер).
+    font=None — шрифт задают стили (formatting='styles'): прямые свойства run удаляются.
+    """
+    if font is None:
+        strip_run_element(run._r)
+        return
+    is_bold = run.bold
+    run.font.name = None
+    run.font.size = None
+    run.font.bold = None
+    run.font.italic = None
+    run.font.underline = None
+    run.font.color.rgb = None
+    if is_bold is not None:
+        run.bold = is_bold
+    run.font.name, run.font.size = font
+
+
+def process_document_pipeline(doc, paragraphs=None, edits='rebuild', formatting='direct', coalesce=True,
+                              analysis_workers=0, plan=DEFAULT_PLAN):
+    """
+    Выполняет этапы обработки текста из плана за один проход по параграфам документа
+    """
+    if paragraphs is None:
+        paragraphs = collect_document_paragraphs(doc)
+    try:
+        with STATS.stage('process_document_pipeline'):
+            STATS.count(paragraphs_visited=len(paragraphs))
+            if plan.modifies_styles(formatting):
+                apply_style_formatting(doc.styles.element, plan)
+            analyses = parallel_paragraph_analyses(
+                [paragraph._p for paragraph, _ in paragraphs], analysis_workers, plan)
+            before = paragraph_cache_info()
+            for index, (paragraph, in_table) in enumerate(paragraphs):
+                analysis = analyses[index] if analyses else None
+                process_paragraph_pipeline(paragraph, in_table, edits, formatting, analysis, plan)
+                if coalesce:
+                    STATS.count(runs_merged=coalesce_run_elements(paragraph._p))
+            after = paragraph_cache_info()
+        echo(f"✅ Текст обработан за один проход (действий плана: {len(plan.steps())})")
+        record_paragraph_cache(before, after)
+        return True
+    except Exception as e:
+        echo(f"❌ Ошибка при обработке параграфов: {e}")
+        return False
+
+
+# ---------------------------------------------------------------------------
+# Движок lxml: те же этапы, что в process_paragraph_pipeline, но напрямую над
+# элементами w:p/w:r/w:t/w:rPr без объектов Paragraph, Run и Font.
+# Изменения XML повторяют python-docx один в один, поэтому результат идентичен.
+
+def sequence_ranks(*tags):
+    return {qn(tag): rank for rank, tag in enumerate(tags)}
+
+
+R_TAG = qn('w:r')
+T_TAG = qn('w:t')
+TAB_TAG = qn('w:tab')
+PTAB_TAG = qn('w:ptab')
+BR_TAG = qn('w:br')
+CR_TAG = qn('w:cr')
+NO_BREAK_HYPHEN_TAG = qn('w:noBreakHyphen')
+PPR_TAG = qn('w:pPr')
+RPR_TAG = qn('w:rPr')
+SPACING_TAG = qn('w:spacing')
+LINE_SPACING_ATTRS = (qn('w:line'), qn('w:lineRule'))
+B_TAG = qn('w:b')
+W_VAL = qn('w:val')
+W_TYPE = qn('w:type')
+XML_SPACE = qn('xml:space')
+
+# Порядок дочерних элементов w:style и w:docDefaults по схеме
+STYLE_SEQUENCE = sequence_ranks(
+    'w:name', 'w:aliases', 'w:basedOn', 'w:next', 'w:link', 'w:autoRedefine', 'w:hidden', 'w:uiPriority',
+    'w:semiHidden', 'w:unhideWhenUsed', 'w:qFormat', 'w:locked', 'w:personal', 'w:personalCompose',
+    'w:personalReply', 'w:rsid', 'w:pPr', 'w:rPr', 'w:tblPr', 'w:trPr', 'w:tcPr', 'w:tblStylePr',
+)
+DOC_DEFAULTS_SEQUENCE = sequence_ranks('w:rPrDefault', 'w:pPrDefault')
+SECTPR_SEQUENCE = sequence_ranks(
+    'w:footnotePr', 'w:endnotePr', 'w:type', 'w:pgSz', 'w:pgMar', 'w:paperSrc', 'w:pgBorders',
+    'w:lnNumType', 'w:pgNumType', 'w:cols', 'w:formProt', 'w:vAlign', 'w:noEndnote', 'w:titlePg',
+    'w:textDirection', 'w:bidi', 'w:rtlGutter', 'w:docGrid', 'w:printerSettings', 'w:sectPrChange',
+)
+DEFAULT_PROPERTIES_SEQUENCE = sequence_ranks('w:pPr', 'w:rPr')
+
+# Порядок дочерних элементов w:rPr и w:pPr по схеме (как в python-docx): тег -> позиция
+RPR_SEQUENCE = sequence_ranks(
+    'w:rStyle', 'w:rFonts', 'w:b', 'w:bCs', 'w:i', 'w:iCs', 'w:caps', 'w:smallCaps', 'w:strike',
+    'w:dstrike', 'w:outline', 'w:shadow', 'w:emboss', 'w:imprint', 'w:noProof', 'w:snapToGrid',
+    'w:vanish', 'w:webHidden', 'w:color', 'w:spacing', 'w:w', 'w:kern', 'w:position', 'w:sz',
+    'w:szCs', 'w:highlight', 'w:u', 'w:effect', 'w:bdr', 'w:shd', 'w:fitText', 'w:vertAlign',
+    'w:rtl', 'w:cs', 'w:em', 'w:lang', 'w:eastAsianLayout', 'w:specVanish', 'w:oMath',
+)
+PPR_SEQUENCE = sequence_ranks(
+    'w:pStyle', 'w:keepNext', 'w:keepLines', 'w:pageBreakBefore', 'w:framePr', 'w:widowControl',
+    'w:numPr', 'w:suppressLineNumbers', 'w:pBdr', 'w:shd', 'w:tabs', 'w:suppressAutoHyphens',
+    'w:kinsoku', 'w:wordWrap', 'w:overflowPunct', 'w:topLinePunct', 'w:autoSpaceDE',
+    'w:autoSpaceDN', 'w:bidi', 'w:adjustRightInd', 'w:snapToGrid', 'w:spacing', 'w:ind',
+    'w:contextualSpacing', 'w:mirrorIndents', 'w:suppressOverlap', 'w:jc', 'w:textDirection',
+    'w:textAlignment', 'w:textboxTightWrap', 'w:outlineLvl', 'w:divId', 'w:cnfStyle', 'w:rPr',
+    'w:sectPr', 'w:pPrChange',
+)
+# Элементы форматирования run, которые удаляет сброс (шрифт, размер, жирный, курсив, подчёркивание, цвет)
+RESET_RPR_TAGS = tuple(qn(tag) for tag in ('w:rFonts', 'w:sz', 'w:b', 'w:i', 'w:u', 'w:color'))
+
+
+def insert_in_sequence(parent, child, sequence):
+    """
+    Вставляет элемент перед ближайшим по схеме последующим элементом, как python-docx:
+    среди последующих тегов берётся самый ранний по схеме, из его элементов — первый
+    """
+    rank = sequence[child.tag]
+    successor = None
+    successor_rank = None
+    for existing in parent:
+        existing_rank = sequence.get(existing.tag)
+        if existing_rank is None or existing_rank <= rank:
+            continue
+        if successor is None or existing_rank < successor_rank:
+            successor, successor_rank = existing, existing_rank
+    if successor is not None:
+        successor.addprevious(child)
+    else:
+        parent.append(child)
+    return child
+
+
+def get_or_add_child(parent, nsptag, sequence):
+    child = parent.find(qn(nsptag))
+    if child is None:
+        child = insert_in_sequence(parent, OxmlElement(nsptag), sequence)
+    return child
+
+
+def get_or_add_properties(element, nsptag):
+    """
+    Возвращает w:pPr/w:rPr элемента, создавая его первым дочерним при отсутствии
+    """
+    properties = element.find(qn(nsptag))
+    if properties is None:
+        properties = OxmlElement(nsptag)
+        element.insert(0, properties)
+    return properties
+
+
+def run_element_text(r):
+    """
+    Текст run так же, как его возвращает Run.text: табуляции, переносы строк и неразрывные дефисы
+    переводятся в символы
+    """
+    parts = []
+    for child in r:
+        tag = child.tag
+        if tag == T_TAG:
+            parts.append(child.text or '')
+        elif tag == TAB_TAG or tag == PTAB_TAG:
+            parts.append('\t')
+        elif tag == BR_TAG:
+            if child.get(W_TYPE, 'textWrapping') == 'textWrapping':
+                parts.append('\n')
+        elif tag == CR_TAG:
+            parts.append('\n')
+        elif tag == NO_BREAK_HYPHEN_TAG:
+            parts.append('-')
+    return ''.join(parts)
+
+
+def run_element_bold(r):
+    """
+    Значение w:b run: True/False или None, если жирность не задана напрямую
+    """
+    rPr = r.find(RPR_TAG)
+    if rPr is None:
+        return None
+    b = rPr.find(B_TAG)
+    if b is None:
+        return None
+    value = b.get(W_VAL)
+    if value is None:
+        return True
+    if value not in ('1', '0', 'true', 'false', 'on', 'off'):
+        raise ValueError(f"недопустимое значение w:b/@w:val: '{value}'")
+    return value in ('1', 'true', 'on')
+
+
+# Заготовки свойств run: элементы копируются с них, а не создаются заново
+BOLD_TEMPLATES = {True: OxmlElement('w:b'), False: OxmlElement('w:b', attrs={W_VAL: '0'})}
+
+
+def add_bold_element(rPr, bold):
+    insert_in_sequence(rPr, copy.deepcopy(BOLD_TEMPLATES[bool(bold)]), RPR_SEQUENCE)
+
+
+@functools.lru_cache(maxsize=None)
+def font_templates(font):
+    """
+    Заготовки w:rFonts и w:sz для шрифта (имя, размер): размер записывается в полупунктах,
+    как после run.font.name и run.font.size (14pt — w:sz = 28)
+    """
+    name, size = font
+    return (OxmlElement('w:rFonts', attrs={qn('w:ascii'): name, qn('w:hAnsi'): name}),
+            OxmlElement('w:sz', attrs={W_VAL: str(int(size.pt * 2))}))
+
+
+def add_uniform_font_elements(rPr, font):
+    """
+    Добавляет шрифт и размер font (имя, размер)
+    """
+    for template in font_templates(font):
+        insert_in_sequence(rPr, copy.deepcopy(template), RPR_SEQUENCE)
+
+
+def reset_run_element(r, font):
+    """
+    Сброс форматирования run с сохранением жирности и установка единого шрифта font (имя, размер).
+    font=None — шрифт задают стили (formatting='styles'): прямые свойства run удаляются.
+    """
+    if font is None:
+        strip_run_element(r)
+        return
+    is_bold = run_element_bold(r)
+    rPr = get_or_add_properties(r, 'w:rPr')
+    for tag in RESET_RPR_TAGS:
+        for child in rPr.findall(tag):
+            rPr.remove(child)
+    if is_bold is not None:
+        add_bold_element(rPr, is_bold)
+    add_uniform_font_elements(rPr, font)
+
+
+# Прямые свойства run, которые остаются при formatting='styles': жирность, стиль символов
+# и верхний/нижний индекс (м², H₂O) — всё остальное задают стили документа
+KEPT_RPR_TAGS = frozenset(qn(tag) for tag in ('w:rStyle', 'w:b', 'w:bCs', 'w:vertAlign'))
+# Свойства, которые снимаются со всех стилей: шрифт, размер и интервал задаются
+# один раз в docDefaults и стиле Normal
+STYLE_RPR_TAGS = tuple(qn(tag) for tag in ('w:rFonts', 'w:sz', 'w:szCs'))
+STYLE_TAG = qn('w:style')
+W_STYLE_TYPE = qn('w:type')
+W_DEFAULT = qn('w:default')
+DOC_DEFAULTS_TAG = qn('w:docDefaults')
+
+
+def strip_run_element(r):
+    """
+    Удаляет прямые свойства run, кроме KEPT_RPR_TAGS; пустой w:rPr удаляется целиком
+    """
+    rPr = r.find(RPR_TAG)
+    if rPr is None:
+        return
+    for child in list(rPr):
+        if child.tag not in KEPT_RPR_TAGS:
+            rPr.remove(child)
+    if len(rPr) == 0:
+        r.remove(rPr)
+
+
+def set_uniform_style_properties(rPr, pPr, plan):
+    """
+    Задаёт в свойствах стиля (или docDefaults) шрифт, размер и межстрочный интервал плана
+    """
+    if plan.font is not None:
+        for tag in STYLE_RPR_TAGS:
+            for child in rPr.findall(tag):
+                rPr.remove(child)
+        rFonts_template, sz_template = font_templates(plan.font)
+        rFonts = copy.deepcopy(rFonts_template)
+        rFonts.set(qn('w:cs'), plan.font[0])
+        insert_in_sequence(rPr, rFonts, RPR_SEQUENCE)
+        insert_in_sequence(rPr, copy.deepcopy(sz_template), RPR_SEQUENCE)
+        insert_in_sequence(rPr, OxmlElement('w:szCs', attrs={W_VAL: sz_template.get(W_VAL)}), RPR_SEQUENCE)
+    if plan.spacing is not None:
+        spacing = get_or_add_child(pPr, 'w:spacing', PPR_SEQUENCE)
+        spacing.set(qn('w:line'), plan.spacing_attrs[0])
+        spacing.set(qn('w:lineRule'), 'auto')
+
+
+def remove_line_spacing(pPr):
+    """
+    Удаляет межстрочный интервал (w:line и w:lineRule) из свойств абзаца или стиля pPr,
+    чтобы действовал интервал из стилей. Опустевший w:spacing удаляется.
+    Возвращает True, если интервал был задан.
+    """
+    spacing = pPr.find(SPACING_TAG) if pPr is not None else None
+    if spacing is None:
+        return False
+    removed = False
+    for name in LINE_SPACING_ATTRS:
+        if name in spacing.attrib:
+            del spacing.attrib[name]
+            removed = True
+    if not spacing.attrib:
+        pPr.remove(spacing)
+    return removed
+
+
+def apply_style_formatting(styles, plan=DEFAULT_PLAN):
+    """
+    Единый шрифт через стили: шрифт, размер и интервал плана (по умолчанию Times New Roman 14pt
+    и 1.5) задаются в docDefaults и стиле абзаца по умолчанию (Normal), а остальные стили больше
+    не переопределяют шрифт, размер и межстрочный интервал. styles — элемент w:styles. Работа
+    пропорциональна числу стилей, а не числу run. Интервалы до и после остаются у параграфов:
+    стили не отличают параграфы таблиц, у которых они не меняются.
+    """
+    doc_defaults = styles.find(DOC_DEFAULTS_TAG)
+    if doc_defaults is None:
+        doc_defaults = OxmlElement('w:docDefaults')
+        styles.insert(0, doc_defaults)
+    rPr_default = get_or_add_child(doc_defaults, 'w:rPrDefault', DOC_DEFAULTS_SEQUENCE)
+    pPr_default = get_or_add_child(doc_defaults, 'w:pPrDefault', DOC_DEFAULTS_SEQUENCE)
+    set_uniform_style_properties(
+        get_or_add_child(rPr_default, 'w:rPr', DEFAULT_PROPERTIES_SEQUENCE),
+        get_or_add_child(pPr_default, 'w:pPr', DEFAULT_PROPERTIES_SEQUENCE), plan)
+    normal = None
+    for style in styles.iter(STYLE_TAG):
+        # Стиль абзаца по умолчанию — последний из отмеченных w:default, как в python-docx
+        if style.get(W_STYLE_TYPE) == 'paragraph' and style.get(W_DEFAULT) == '1':
+            normal = style
+        rPr = style.find(RPR_TAG)
+        if rPr is not None and plan.font is not None:
+            for tag in STYLE_RPR_TAGS:
+                for child in rPr.findall(tag):
+                    rPr.remove(child)
+        if plan.spacing is not None:
+            # Включая условное оформление стилей таблиц (w:tblStylePr)
+            for pPr in style.iter(PPR_TAG):
+                remove_line_spacing(pPr)
+    if normal is not None:
+        set_uniform_style_properties(
+            get_or_add_child(normal, 'w:rPr', STYLE_SEQUENCE),
+            get_or_add_child(normal, 'w:pPr', STYLE_SEQUENCE), plan)
+
+
+def make_run_template(bold, font=None):
+    r = OxmlElement('w:r')
+    if font is None and bold is None:
+        return r
+    rPr = OxmlElement('w:rPr')
+    r.append(rPr)
+    if font is not None:
+        add_uniform_font_elements(rPr, font)
+    if bold is not None:
+        add_bold_element(rPr, bold)
+    return r
+
+
+# Заготовки run для каждого шрифта (None — без шрифта) и значения жирности: новые run копируются с них
+RUN_TEMPLATES = {}
+T_TEMPLATE = OxmlElement('w:t')
+TAB_TEMPLATE = OxmlElement('w:tab')
+BR_TEMPLATE = OxmlElement('w:br')
+# Символы, которые python-docx переводит в отдельные элементы run
+RUN_SPECIAL_CHARS_RE = re.compile(r'[\t\r\n]')
+
+
+def append_run_element(p, text, bold=None, font=None):
+    """
+    Добавляет в параграф run с текстом и единым шрифтом, как paragraph.add_run(text)
+    с последующей установкой шрифта, размера и жирности
+    """
+    template = RUN_TEMPLATES.get((font, bold))
+    if template is None:
+        template = RUN_TEMPLATES[font, bold] = make_run_template(bold, font)
+    r = copy.deepcopy(template)
+    r.extend(make_text_elements(text))
+    p.append(r)
+    return r
+
+
+def make_text_elements(text):
+    """
+    Элементы содержимого run для текста: w:t, а табуляции и переносы строк — w:tab и w:br
+    """
+    elements = []
+    last_pos = 0
+    for match in RUN_SPECIAL_CHARS_RE.finditer(text):
+        if match.start() > last_pos:
+            elements.append(make_t_element(text[last_pos:match.start()]))
+        elements.append(copy.deepcopy(TAB_TEMPLATE if match.group() == '\t' else BR_TEMPLATE))
+        last_pos = match.end()
+    if last_pos < len(text):
+        elements.append(make_t_element(text[last_pos:]))
+    return elements
+
+
+def make_t_element(text):
+    t = copy.deepcopy(T_TEMPLATE)
+    set_t_element_text(t, text)
+    return t
+
+
+def set_t_element_text(t, text):
+    t.text = text
+    if len(text.strip()) < len(text):
+        t.set(XML_SPACE, 'preserve')
+
+
+def clear_paragraph_element(p):
+    """
+    Удаляет всё содержимое параграфа, кроме w:pPr
+    """
+    for child in list(p):
+        if child.tag != PPR_TAG:
+            p.remove(child)
+
+
+def paragraph_element_text(p):
+    """
+    Текст параграфа так же, как ''.join(run.text for run in paragraph.runs)
+    """
+    return ''.join([run_element_text(r) for r in p.findall(R_TAG)])
+
+
+def process_paragraph_element(p, in_table=False, edits='rebuild', formatting='direct', analysis=None,
+                              plan=DEFAULT_PLAN):
+    """
+    Аналог process_paragraph_pipeline для элемента w:p
+    """
+    runs = p.findall(R_TAG)
+    full_text = ''.join([run_element_text(r) for r in runs])
+    if analysis is None:
+        analysis = cached_analyze_paragraph_text(full_text, plan)
+    new_text, changed, number_spans, replacements = analysis
+    font = plan.run_font(formatting)
+    runs_created = 0
+
+    if edits == 'splice':
+        if plan.font is not None:
+            for r in runs:
+                reset_run_element(r, font)
+        runs_created = splice_paragraph_element(p, runs, full_text, new_text, number_spans)
+    elif number_spans:
+        clear_paragraph_element(p)
+        last_pos = 0
+        for start, end in number_spans:
+            if start > last_pos:
+                append_run_element(p, new_text[last_pos:start], False, font)
+                runs_created += 1
+            append_run_element(p, new_text[start:end], True, font)
+            runs_created += 1
+            last_pos = end
+        if last_pos < len(new_text):
+            append_run_element(p, new_text[last_pos:], False, font)
+            runs_created += 1
+    elif changed:
+        first_bold = run_element_bold(runs[0])
+        clear_paragraph_element(p)
+        append_run_element(p, new_text, first_bold, font)
+        runs_created = 1
+    elif plan.font is not None:
+        for r in runs:
+            reset_run_element(r, font)
+    record_pipeline_changes(replacements, number_spans, runs_created)
+
+    if plan.spacing is not None:
+        line, before, after = plan.spacing_attrs
+        if formatting == 'styles':
+            # Межстрочный интервал задан в стилях (apply_style_formatting)
+            remove_line_spacing(p.find(PPR_TAG))
+            line = None
+        if line is not None or not in_table:
+            spacing = get_or_add_child(get_or_add_properties(p, 'w:pPr'), 'w:spacing', PPR_SEQUENCE)
+            if line is not None:
+                spacing.set(qn('w:line'), line)
+                spacing.set(qn('w:lineRule'), 'auto')
+            if not in_table:
+                spacing.set(qn('w:before'), before)
+                spacing.set(qn('w:after'), after)
+    if plan.justify:
+        jc = get_or_add_child(get_or_add_properties(p, 'w:pPr'), 'w:jc', PPR_SEQUENCE)
+        jc.set(W_VAL, 'both')
+
+
+# ---------------------------------------------------------------------------
+# Точечные правки (edits='splice'): вместо сборки параграфа заново изменения текста
+# переносятся на существующие run по смещениям символов. Меняются только затронутые
+# w:t, а свойства run, рисунки, сноски и поля остаются на месте.
+
+def text_element_value(child):
+    """
+    Текст дочернего элемента run так же, как в run_element_text ('' для элементов без текста)
+    """
+    tag = child.tag
+    if tag == T_TAG:
+        return child.text or ''
+    if tag == TAB_TAG or tag == PTAB_TAG:
+        return '\t'
+    if tag == BR_TAG:
+        return '\n' if child.get(W_TYPE, 'textWrapping') == 'textWrapping' else ''
+    if tag == CR_TAG:
+        return '\n'
+    if tag == NO_BREAK_HYPHEN_TAG:
+        return '-'
+    return ''
+
+
+def collect_text_atoms(runs):
+    """
+    Элементы run, дающие текст: (run, элемент, смещение в тексте параграфа, текст)
+    """
+    atoms = []
+    pos = 0
+    for r in runs:
+        for child in r:
+            value = text_element_value(child)
+            if value:
+                atoms.append((r, child, pos, value))
+                pos += len(value)
+    return atoms
+
+
+# Слова вместе с последующими пробелами (и пробелы в начале текста): покрывают текст целиком
+EDIT_TOKEN_RE = re.compile(r'\S+\s*|\s+')
+
+
+def token_offsets(tokens):
+    offsets = [0]
+    for token in tokens:
+        offsets.append(offsets[-1] + len(token))
+    return offsets
+
+
+def text_edit_opcodes(old_text, new_text):
+    """
+    Правки, переводящие old_text в new_text, в формате SequenceMatcher.get_opcodes().
+    Тексты выравниваются по словам; у заменённых участков отбрасываются общие начало и конец.
+    Правила меняют текст локально, поэтому посимвольное выравнивание не требуется.
+    """
+    old_tokens = EDIT_TOKEN_RE.findall(old_text)
+    new_tokens = EDIT_TOKEN_RE.findall(new_text)
+    old_offsets = token_offsets(old_tokens)
+    new_offsets = token_offsets(new_tokens)
+    opcodes = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old_tokens, new_tokens).get_opcodes():
+        a1, a2, b1, b2 = old_offsets[i1], old_offsets[i2], new_offsets[j1], new_offsets[j2]
+        if tag != 'replace':
+            opcodes.append((tag, a1, a2, b1, b2))
+            continue
+        prefix = len(os.path.commonprefix([old_text[a1:a2], new_text[b1:b2]]))
+        suffix = 0
+        limit = min(a2 - a1, b2 - b1) - prefix
+        while suffix < limit and old_text[a2 - suffix - 1] == new_text[b2 - suffix - 1]:
+            suffix += 1
+        if prefix:
+            opcodes.append(('equal', a1, a1 + prefix, b1, b1 + prefix))
+        opcodes.append(('replace', a1 + prefix, a2 - suffix, b1 + prefix, b2 - suffix))
+        if suffix:
+            opcodes.append(('equal', a2 - suffix, a2, b2 - suffix, b2))
+    return opcodes
+
+
+def splice_run_text(runs, old_text, new_text):
+    """
+    Переносит изменение текста параграфа на его run. Правки находятся выравниванием старого
+    и нового текста; вставленный текст получает run предшествующего символа, замена — run
+    первого заменённого символа. Run, оставшиеся без содержимого, удаляются.
+    """
+    atoms = collect_text_atoms(runs)
+    starts = [atom[2] for atom in atoms]
+    parts = [[] for _ in atoms]
+    # Весь текст в одном элементе: выравнивание не нужно
+    opcodes = text_edit_opcodes(old_text, new_text) if len(atoms) > 1 else [('replace', 0, 0, 0, len(new_text))]
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal':
+            index = bisect.bisect_right(starts, i1) - 1
+            while index < len(atoms) and starts[index] < i2:
+                start = max(starts[index], i1)
+                end = min(starts[index] + len(atoms[index][3]), i2)
+                parts[index].append(new_text[j1 + start - i1:j1 + end - i1])
+                index += 1
+        elif j1 < j2:
+            position = i1 if i1 < i2 or i1 == 0 else i1 - 1
+            parts[bisect.bisect_right(starts, position) - 1].append(new_text[j1:j2])
+
+    for (r, child, _, value), atom_parts in zip(atoms, parts):
+        text = ''.join(atom_parts)
+        if text == value:
+            continue
+        replace_text_element(child, text)
+        if all(element.tag == RPR_TAG for element in r):
+            r.getparent().remove(r)
+
+
+def replace_text_element(child, text):
+    """
+    Заменяет текст элемента run; w:t без табуляций и переносов правится на месте
+    """
+    if child.tag == T_TAG and text and not RUN_SPECIAL_CHARS_RE.search(text):
+        set_t_element_text(child, text)
+        return
+    for element in make_text_elements(text):
+        child.addprevious(element)
+    child.getparent().remove(child)
+
+
+def split_run_element(r, offset):
+    """
+    Делит run на два по смещению в его тексте; вторая часть получает копию свойств run
+    и вставляется следом. Возвращает вторую часть.
+    """
+    tail = OxmlElement('w:r', attrs=dict(r.attrib))
+    pos = 0
+    for child in list(r):
+        if child.tag == RPR_TAG:
+            tail.append(copy.deepcopy(child))
+            continue
+        value = text_element_value(child)
+        if pos >= offset:
+            tail.append(child)
+        elif pos + len(value) > offset:
+            # Граница внутри w:t (остальные элементы дают не больше одного символа)
+            set_t_element_text(child, value[:offset - pos])
+            tail.append(make_t_element(value[offset - pos:]))
+        pos += len(value)
+    r.addnext(tail)
+    return tail
+
+
+def set_run_element_bold(r, bold):
+    rPr = get_or_add_properties(r, 'w:rPr')
+    for b in rPr.findall(B_TAG):
+        rPr.remove(b)
+    add_bold_element(rPr, bold)
+
+
+def apply_number_bold(p, number_spans):
+    """
+    Делит run по границам чисел: числа становятся жирными, остальной текст — обычным.
+    Возвращает число созданных run.
+    """
+    span_starts = [start for start, _ in number_spans]
+    boundaries = sorted({pos for span in number_spans for pos in span})
+    runs_created = 0
+    run_start = 0
+    for r in p.findall(R_TAG):
+        run_end = run_start + len(run_element_text(r))
+        if run_end == run_start:
+            continue
+        cuts = boundaries[bisect.bisect_right(boundaries, run_start):bisect.bisect_left(boundaries, run_end)]
+        pieces = [r]
+        for cut in reversed(cuts):
+            pieces.insert(1, split_run_element(r, cut - run_start))
+        for piece, piece_start in zip(pieces, [run_start, *cuts]):
+            index = bisect.bisect_right(span_starts, piece_start) - 1
+            set_run_element_bold(piece, index >= 0 and piece_start < number_spans[index][1])
+        runs_created += len(cuts)
+        run_start = run_end
+    return runs_created
+
+
+def splice_paragraph_element(p, runs, full_text, new_text, number_spans):
+    """
+    Точечно применяет результат обработки текста к параграфу, форматирование run
+    уже должно быть сброшено. Возвращает число созданных run.
+    """
+    if new_text != full_text:
+        splice_run_text(runs, full_text, new_text)
+    if number_spans:
+        return apply_number_bold(p, number_spans)
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# Объединение run: сброс форматирования и выделение чисел оставляют рядом run с одинаковыми
+# свойствами (исходные разбиения Word, чередование жирного и обычного текста). Соседние run
+# с одинаковым w:rPr и только текстовым содержимым сливаются в один.
+
+# Содержимое run, которое можно переносить в соседний run без изменения документа
+MERGEABLE_RUN_CONTENT_TAGS = frozenset((RPR_TAG, T_TAG, TAB_TAG, PTAB_TAG, BR_TAG, CR_TAG, NO_BREAK_HYPHEN_TAG))
+
+
+def run_properties_key(r):
+    """
+    Ключ свойств run для сравнения: теги и атрибуты элементов w:rPr (пустой, если свойств нет).
+    Для run с нетекстовым содержимым (рисунки, поля, сноски) возвращает None.
+    """
+    rPr = None
+    for child in r:
+        if child.tag not in MERGEABLE_RUN_CONTENT_TAGS:
+            return None
+        if child.tag == RPR_TAG:
+            rPr = child
+    if rPr is None:
+        return ()
+    # Свойства run обычно плоские: теги и атрибуты сравниваются без сериализации
+    if any(len(child) for child in rPr):
+        return etree.tostring(rPr)
+    return tuple((child.tag, tuple(child.attrib.items())) for child in rPr)
+
+
+def merge_run_element(target, r):
+    """
+    Переносит содержимое run r в конец target; смежные w:t сливаются в один
+    """
+    last = target[-1] if len(target) else None
+    for child in list(r):
+        if child.tag == RPR_TAG:
+            continue
+        if child.tag == T_TAG and last is not None and last.tag == T_TAG:
+            set_t_element_text(last, (last.text or '') + (child.text or ''))
+            continue
+        target.append(child)
+        last = child
+    r.getparent().remove(r)
+
+
+def coalesce_run_elements(p):
+    """
+    Объединяет соседние run параграфа с одинаковыми свойствами.
+    Run внутри гиперссылок и полей, а также run с нетекстовым содержимым не затрагиваются.
+    Возвращает число удалённых run.
+    """
+    merged = 0
+    previous = previous_key = None
+    for r in p.findall(R_TAG):
+        key = run_properties_key(r)
+        if key is not None and key == previous_key and r.getprevious() is previous:
+            merge_run_element(previous, r)
+            merged += 1
+            continue
+        previous, previous_key = r, key
+    return merged
+
+
+def coalesce_runs(doc, paragraphs=None):
+    """
+    Объединяет соседние run с одинаковыми свойствами во всём документе
+    """
+    if paragraphs is None:
+        paragraphs = collect_document_paragraphs(doc)
+    try:
+        with STATS.stage('coalesce_runs'):
+            STATS.count(paragraphs_visited=len(paragraphs))
+            for paragraph, _ in paragraphs:
+                merged = coalesce_run_elements(paragraph._p)
+                if merged:
+                    STATS.count(paragraphs_changed=1, runs_merged=merged)
+        echo("✅ Объединены соседние run с одинаковым оформлением")
+        return True
+    except Exception as e:
+        echo(f"❌ Ошибка при объединении run: {e}")
+        return False
+
+
+def process_document_lxml(doc, paragraph_elements=None, edits='rebuild', formatting='direct', coalesce=True,
+                          analysis_workers=0, plan=DEFAULT_PLAN):
+    """
+    Выполняет этапы обработки текста из плана за один проход движком lxml
+    """
+    if paragraph_elements is None:
+        paragraph_elements = collect_paragraph_elements(doc.element.body)
+    try:
+        with STATS.stage('process_document_lxml'):
+            STATS.count(paragraphs_visited=len(paragraph_elements))
+            if plan.modifies_styles(formatting):
+                apply_style_formatting(doc.styles.element, plan)
+            analyses = parallel_paragraph_analyses([p for p, _ in paragraph_elements], analysis_workers, plan)
+            before = paragraph_cache_info()
+            for index, (p, in_table) in enumerate(paragraph_elements):
+                analysis = analyses[index] if analyses else None
+                process_paragraph_element(p, in_table, edits, formatting, analysis, plan)
+                if coalesce:
+                    STATS.count(runs_merged=coalesce_run_elements(p))
+            after = paragraph_cache_info()
+        echo(f"✅ Текст обработан за один проход движком lxml (действий плана: {len(plan.steps())})")
+        record_paragraph_cache(before, after)
+        return True
+    except Exception as e:
+        echo(f"❌ Ошибка при обработке параграфов: {e}")
+        return False
+
+
+def process_document_staged(doc, paragraphs=None, edits='rebuild', formatting='direct', coalesce=True):
+    """
+    Выполняет этапы обработки по очереди, каждый — отдельным проходом по документу
+    """
+    if paragraphs is None:
+        paragraphs = collect_document_paragraphs(doc)
+    if not reset_text_formatting_except_bold(doc, paragraphs, formatting):
+        return False
+    if not apply_uniform_formatting(doc, paragraphs, formatting):
+        return False
+    if not process_special_spaces(doc, paragraphs, edits):
+        return False
+    if not process_quotes(doc, paragraphs, edits):
+        return False
+    if not normalize_dates(doc, paragraphs, edits):
+        return False
+    if not format_numbers(doc, paragraphs, edits):
+        return False
+    if not process_stanitsa_abbreviations(doc, paragraphs, edits):
+        return False
+    if not make_numbers_bold(doc, paragraphs, edits, formatting):
+        return False
+    if coalesce and not coalesce_runs(doc, paragraphs):
+        return False
+    if not set_justify_alignment(doc, paragraphs):
+        return False
+    return True
+
+
+# Форматы записей ZIP-архива (APPNOTE.TXT): локальный заголовок, запись центрального каталога, его конец
+ZIP_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+ZIP_CENTRAL_HEADER = struct.Struct('<4s6H3L5H2L')
+ZIP_END_OF_CENTRAL_DIRECTORY = struct.Struct('<4s4H2LH')
+ZIP_DATA_DESCRIPTOR = struct.Struct('<4s3L')
+ZIP_LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+ZIP_CENTRAL_HEADER_SIGNATURE = b'PK\x01\x02'
+ZIP_END_OF_CENTRAL_DIRECTORY_SIGNATURE = b'PK\x05\x06'
+ZIP_DATA_DESCRIPTOR_SIGNATURE = b'PK\x07\x08'
+ZIP_FLAG_ENCRYPTED = 0x01
+ZIP_FLAG_DATA_DESCRIPTOR = 0x08
+ZIP_FLAG_UTF8 = 0x800
+ZIP_VERSION = 20
+ZIP_MAX_SIZE = 0xFFFFFFFF
+ZIP_MAX_ENTRIES = 0xFFFF
+ZIP_COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def zip_dos_datetime(date_time):
+    year, month, day, hour, minute, second = date_time
+    return (hour << 11 | minute << 5 | second // 2), ((year - 1980) << 9 | month << 5 | day)
+
+
+def zip_encode_name(name, flags):
+    return name.encode('utf-8' if flags & ZIP_FLAG_UTF8 else 'cp437')
+
+
+def can_copy_package(archive, part_names):
+    """
+    Проверяет, что архив можно переписать копированием записей: все части пакета
+    уже есть в архиве, нет шифрования и записей ZIP64
+    """
+    infos = archive.infolist()
+    names = {info.filename for info in infos}
+    if not part_names <= names or len(infos) >= ZIP_MAX_ENTRIES:
+        return False
+    for info in infos:
+        if info.flag_bits & ZIP_FLAG_ENCRYPTED:
+            return False
+        if max(info.file_size, info.compress_size, info.header_offset) >= ZIP_MAX_SIZE:
+            return False
+    return True
+
+
+def write_document_package(doc, source, output, compress_level=6, modified_parts=None):
+    """
+    Сохраняет документ, перезаписывая только изменённые XML-части (по умолчанию — word/document.xml).
+    source и output — пути или двоичные потоки.
+    Сжатые данные остальных записей (изображения, диаграммы, внедрённые объекты) копируются
+    из исходного архива без распаковки. Возвращает False, если пакет так переписать нельзя
+    (например, python-docx добавил новые части) — тогда документ нужно сохранить через doc.save.
+    """
+    package = doc.part.package
+    if modified_parts is None:
+        modified_parts = (doc.part,)
+    blobs = {part.partname[1:]: part.blob for part in modified_parts}
+    part_names = {part.partname[1:] for part in package.iter_parts()}
+
+    with zipfile.ZipFile(source) as archive:
+        if not can_copy_package(archive, part_names):
+            return False
+        write_package_entries(archive, output, compress_level, blobs)
+    return True
+
+
+class DeflateEntryWriter:
+    """
+    Файловый объект для записи части архива по мере формирования: данные сжимаются
+    и сразу пишутся в out, CRC и размеры считаются на ходу
+    """
+
+    def __init__(self, out, compress_level):
+        self.out = out
+        self.compressor = zlib.compressobj(compress_level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self.crc = 0
+        self.file_size = 0
+        self.compress_size = 0
+
+    def write(self, data):
+        self.crc = zlib.crc32(data, self.crc)
+        self.file_size += len(data)
+        self._write_compressed(self.compressor.compress(data))
+        return len(data)
+
+    def close(self):
+        self._write_compressed(self.compressor.flush())
+
+    def _write_compressed(self, chunk):
+        if chunk:
+            self.out.write(chunk)
+            self.compress_size += len(chunk)
+
+
+def write_package_entries(archive, output, compress_level=6, blobs=None, streams=None):
+    """
+    Записывает архив в порядке записей исходного: части из blobs (имя -> данные) сжимаются заново,
+    части из streams (имя -> функция, пишущая содержимое в файловый объект) сжимаются по мере
+    записи и завершаются дескриптором данных, остальные копируются без распаковки.
+    """
+    blobs = blobs or {}
+    streams = streams or {}
+    with open_output(output) as out:
+        base = out.tell()
+        central_directory = []
+        for info in archive.infolist():
+            offset = out.tell() - base
+            blob = blobs.get(info.filename)
+            stream = streams.get(info.filename)
+            if stream is not None:
+                # Размеры и CRC заранее неизвестны: в локальном заголовке нули, значения — в дескрипторе
+                flags = (info.flag_bits & ZIP_FLAG_UTF8) | ZIP_FLAG_DATA_DESCRIPTOR
+                method, crc, compress_size, file_size = zipfile.ZIP_DEFLATED, 0, 0, 0
+            elif blob is None:
+                flags = info.flag_bits & ~ZIP_FLAG_DATA_DESCRIPTOR
+                method, crc = info.compress_type, info.CRC
+                compress_size, file_size = info.compress_size, info.file_size
+            else:
+                flags = info.flag_bits & ZIP_FLAG_UTF8
+                compressor = zlib.compressobj(compress_level, zlib.DEFLATED, -zlib.MAX_WBITS)
+                data = compressor.compress(blob) + compressor.flush()
+                method, crc = zipfile.ZIP_DEFLATED, zlib.crc32(blob)
+                compress_size, file_size = len(data), len(blob)
+                if max(compress_size, file_size) >= ZIP_MAX_SIZE:
+                    raise zipfile.LargeZipFile(f"Часть {info.filename} слишком велика")
+            name = zip_encode_name(info.filename, flags)
+            dos_time, dos_date = zip_dos_datetime(info.date_time)
+            out.write(ZIP_LOCAL_HEADER.pack(
+                ZIP_LOCAL_HEADER_SIGNATURE, ZIP_VERSION, flags, method, dos_time, dos_date,
+                crc, compress_size, file_size, len(name), 0))
+            out.write(name)
+            if stream is not None:
+                entry = DeflateEntryWriter(out, compress_level)
+                stream(entry)
+                entry.close()
+                crc, compress_size, file_size = entry.crc, entry.compress_size, entry.file_size
+                if max(compress_size, file_size) >= ZIP_MAX_SIZE:
+                    raise zipfile.LargeZipFile(f"Часть {info.filename} слишком велика")
+                out.write(ZIP_DATA_DESCRIPTOR.pack(ZIP_DATA_DESCRIPTOR_SIGNATURE, crc, compress_size, file_size))
+            elif blob is None:
+                copy_raw_entry(archive.fp, info, out)
+            else:
+                out.write(data)
+            if offset >= ZIP_MAX_SIZE:
+                raise zipfile.LargeZipFile("Архив слишком велик")
+            central_directory.append(ZIP_CENTRAL_HEADER.pack(
+                ZIP_CENTRAL_HEADER_SIGNATURE, ZIP_VERSION, ZIP_VERSION, flags, method, dos_time, dos_date,
+                crc, compress_size, file_size, len(name), 0, len(info.comment), 0,
+                info.internal_attr, info.external_attr, offset) + name + info.comment)
+
+        directory_offset = out.tell() - base
+        for record in central_directory:
+            out.write(record)
+        directory_size = out.tell() - base - directory_offset
+        if directory_offset >= ZIP_MAX_SIZE:
+            raise zipfile.LargeZipFile("Архив слишком велик")
+        out.write(ZIP_END_OF_CENTRAL_DIRECTORY.pack(
+            ZIP_END_OF_CENTRAL_DIRECTORY_SIGNATURE, 0, 0, len(central_directory), len(central_directory),
+            directory_size, directory_offset, len(archive.comment)) + archive.comment)
+
+
+def open_output(output):
+    """
+    Открывает путь на запись; уже открытый поток возвращается как есть и не закрывается
+    """
+    if hasattr(output, 'write'):
+        return contextlib.nullcontext(output)
+    return open(output, 'wb')
+
+
+def copy_raw_entry(fp, info, out):
+    """
+    Копирует сжатые данные записи архива, пропуская её локальный заголовок
+    """
+    fp.seek(info.header_offset)
+    header = ZIP_LOCAL_HEADER.unpack(fp.read(ZIP_LOCAL_HEADER.size))
+    if header[0] != ZIP_LOCAL_HEADER_SIGNATURE:
+        raise zipfile.BadZipFile(f"Повреждён заголовок записи {info.filename}")
+    name_length, extra_length = header[-2:]
+    fp.seek(name_length + extra_length, os.SEEK_CUR)
+    remaining = info.compress_size
+    while remaining:
+        chunk = fp.read(min(remaining, ZIP_COPY_CHUNK_SIZE))
+        if not chunk:
+            raise zipfile.BadZipFile(f"Запись {info.filename} обрезана")
+        out.write(chunk)
+        remaining -= len(chunk)
+
+
+def save_document(doc, source, output, options, modified_parts=None):
+    """
+    Сохраняет документ выбранным способом; при невозможности копирования записей — через python-docx
+    """
+    if options['writer'] == 'zip':
+        if write_document_package(doc, source, output, options['compress_level'], modified_parts):
+            return
+        echo("⚠️ Пакет нельзя переписать частично, документ сохраняется целиком")
+    doc.save(output)
+
+
+# ---------------------------------------------------------------------------
+# Потоковый движок (engine='stream'): word/document.xml читается через iterparse, и каждый
+# блок тела документа (параграф или строка таблицы верхнего уровня) обрабатывается функциями
+# движка lxml сразу после разбора, записывается в выходной архив и освобождается.
+# В памяти одновременно находится только текущий блок, а не всё дерево документа.
+
+BODY_TAG = qn('w:body')
+SECTPR_TAG = qn('w:sectPr')
+XMLNS_DECLARATION_RE = re.compile(rb'\sxmlns(?::[\w.-]+)?="[^"]*"')
+
+
+def related_part_name(archive, part_name, reltype):
+    """
+    Имя части архива, на которую ссылается part_name связью типа reltype ('' — сам пакет).
+    Возвращает None, если связи нет.
+    """
+    directory, name = posixpath.split(part_name)
+    rels_name = posixpath.join(directory, '_rels', f'{name}.rels')
+    try:
+        rels = etree.fromstring(archive.read(rels_name))
+    except KeyError:
+        return None
+    for rel in rels:
+        if rel.get('Type') == reltype and rel.get('TargetMode') != 'External':
+            target = rel.get('Target')
+            if target.startswith('/'):
+                return target[1:]
+            return posixpath.normpath(posixpath.join(directory, target))
+    return None
+
+
+def set_section_margins(sectPr, margins):
+    """
+    Поля секции плана ((сторона, длина), ...) в твипах, как section.top_margin = Cm(1.0) и т.д. в python-docx
+    """
+    pgMar = get_or_add_child(sectPr, 'w:pgMar', SECTPR_SEQUENCE)
+    for side, value in margins:
+        pgMar.set(qn(f'w:{side}'), str(value.twips))
+
+
+def block_paragraphs(block):
+    """
+    Параграфы блока тела документа в том же порядке и с тем же признаком таблицы,
+    что и collect_paragraph_elements: блок — параграф тела или строка таблицы тела
+    """
+    if block.tag == P_TAG:
+        return [(block, False)]
+    paragraphs = []
+    for tc in block.iterchildren(TC_TAG):
+        collect_block_paragraphs(tc, True, paragraphs)
+    return paragraphs
+
+
+def element_start_tag(element):
+    """
+    Открывающий тег элемента-контейнера (w:document, w:body, w:tbl) без его содержимого
+    """
+    shell = etree.Element(element.tag, dict(element.attrib), nsmap=element.nsmap)
+    data = etree.tostring(shell, encoding='UTF-8')
+    return data[:-2] + b'>'
+
+
+def strip_inherited_namespaces(data, inherited):
+    """
+    Убирает из открывающего тега сериализованного блока объявления пространств имён,
+    уже сделанные в корне документа: lxml повторяет их у каждого отдельно записанного элемента
+    """
+    end = data.index(b'>')
+    start_tag = XMLNS_DECLARATION_RE.sub(
+        lambda match: b'' if match.group() in inherited else match.group(), data[:end])
+    return start_tag + data[end:]
+
+
+def element_end_tag(element):
+    return f'</{element.prefix}:{etree.QName(element).localname}>'.encode('utf-8') if element.prefix else \
+        f'</{element.tag}>'.encode('utf-8')
+
+
+def stream_document_xml(source, out, edits='rebuild', formatting='direct', coalesce=True, plan=DEFAULT_PLAN):
+    """
+    Читает document.xml из source, обрабатывает блоки тела по мере разбора и пишет результат в out.
+    Каждый обработанный блок удаляется из дерева, поэтому память не растёт с размером документа.
+    Возвращает число обработанных параграфов.
+    """
+    # Как при загрузке python-docx: пробельные узлы между элементами отбрасываются
+    events = etree.iterparse(source, events=('start', 'end'), remove_blank_text=True, resolve_entities=False)
+    containers = []
+    inherited = frozenset()
+    sections = paragraph_count = 0
+    for event, element in events:
+        depth = len(containers)
+        parent = containers[-1] if containers else None
+        is_container = depth == 0 or (depth == 1 and element.tag == BODY_TAG) or \
+            (depth == 2 and element.tag == TBL_TAG and parent.tag == BODY_TAG)
+        if event == 'start':
+            if is_container and (parent is None or element.getparent() is parent):
+                if depth == 0:
+                    out.write(b"<?xml version='1.0' encoding='UTF-8' standalone='yes'?>\n")
+                    start_tag = element_start_tag(element)
+                    # Объявления пространств имён корня повторяются в каждом блоке при сериализации
+                    inherited = frozenset(XMLNS_DECLARATION_RE.findall(start_tag))
+                    out.write(start_tag)
+                else:
+                    out.write(strip_inherited_namespaces(element_start_tag(element), inherited))
+                containers.append(element)
+            continue
+        if containers and element is containers[-1]:
+            containers.pop()
+            out.write(element_end_tag(element))
+            continue
+        if element.getparent() is not parent:
+            continue
+        # Блок тела или таблицы разобран целиком: обработка, запись и освобождение памяти
+        if plan.margins and parent.tag == BODY_TAG and (element.tag == SECTPR_TAG or element.tag == P_TAG):
+            sectPr = element if element.tag == SECTPR_TAG else element.find(f'{PPR_TAG}/{SECTPR_TAG}')
+            if sectPr is not None:
+                sections += 1
+                echo(f"Обрабатываем секцию {sections}")
+                set_section_margins(sectPr, plan.margins)
+        if plan.formats_paragraphs and ((parent.tag == BODY_TAG and element.tag == P_TAG) or
+                                        (parent.tag == TBL_TAG and element.tag == TR_TAG)):
+            for p, in_table in block_paragraphs(element):
+                process_paragraph_element(p, in_table, edits, formatting, plan=plan)
+                if coalesce:
+                    STATS.count(runs_merged=coalesce_run_elements(p))
+                paragraph_count += 1
+        out.write(strip_inherited_namespaces(etree.tostring(element, encoding='UTF-8'), inherited))
+        element.clear()
+        parent.remove(element)
+    return paragraph_count
+
+
+def format_document_stream(source, output, options, plan=DEFAULT_PLAN):
+    """
+    Потоковая обработка документа по плану без загрузки дерева целиком.
+    Возвращает None, если пакет нельзя переписать по записям — тогда документ обрабатывается обычным способом.
+    """
+    with zipfile.ZipFile(source) as archive:
+        document_name = related_part_name(archive, '', RT.OFFICE_DOCUMENT)
+        if document_name is None or not can_copy_package(archive, {document_name}):
+            return None
+        blobs = {}
+        if plan.modifies_styles(options['formatting']):
+            styles_name = related_part_name(archive, document_name, RT.STYLES)
+            if styles_name is None:
+                return None
+            styles = parse_xml(archive.read(styles_name))
+            apply_style_formatting(styles, plan)
+            blobs[styles_name] = etree.tostring(styles, encoding='UTF-8', standalone=True)
+
+        def write_document_part(out):
+            with STATS.stage('process_document_stream'), archive.open(document_name) as document_xml:
+                before = paragraph_cache_info()
+                paragraph_count = stream_document_xml(
+                    document_xml, out, options['edits'], options['formatting'], options['coalesce_runs'], plan)
+                STATS.count(paragraphs_visited=paragraph_count)
+                after = paragraph_cache_info()
+            echo(f"✅ Текст обработан потоковым движком (действий плана: {len(plan.steps())})")
+            record_paragraph_cache(before, after)
+
+        # Обработка идёт во время записи архива, поэтому отдельного времени сохранения нет
+        write_package_entries(archive, output, options['compress_level'], blobs, {document_name: write_document_part})
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Проверка без изменения документа (--check): правила запускаются только для поиска
+# нарушений. document.xml разбирается lxml без python-docx, run не перестраиваются,
+# пакет не сохраняется.
+
+CHECK_RULE_DESCRIPTIONS = {
+    'special_spaces': "специальные пробелы",
+    'quotes': "прямые кавычки",
+    'dates': "дата не в формате «1 января 2024 г.»",
+    'numbers': "десятичная точка, нет пробела перед % или не разделены тысячи",
+    'stanitsa': "сокращение слова «станица» не в виде «ст-ца»",
+    'bold_numbers': "число не выделено жирным",
+}
+# Сколько символов текста вокруг нарушения попадает в отчёт
+CHECK_EXCERPT_CONTEXT = 20
+
+
+def make_violation(rule_name, count, text, offset):
+    start = max(0, offset - CHECK_EXCERPT_CONTEXT)
+    return {
+        'rule': rule_name,
+        'count': count,
+        'offset': offset,
+        'excerpt': text[start:offset + CHECK_EXCERPT_CONTEXT],
+    }
+
+
+def paragraph_violations(p, plan=DEFAULT_PLAN):
+    """
+    Нарушения в параграфе: по одной записи на сработавшее правило с числом замен,
+    позицией первого изменения в тексте, каким его видит правило, и фрагментом текста.
+    Выделение чисел проверяется, только если текст уже соответствует правилам —
+    иначе границы чисел относятся к исправленному тексту.
+    """
+    runs = p.findall(R_TAG)
+    run_texts = [run_element_text(r) for r in runs]
+    full_text = ''.join(run_texts)
+    new_text, changed, number_spans, _ = cached_analyze_paragraph_text(full_text, plan)
+    violations = []
+    if changed:
+        text = full_text
+        for transform in plan.text_rules:
+            if not transform.accepts(text):
+                continue
+            transformed, count = transform.apply(text)
+            if transformed != text:
+                offset = len(os.path.commonprefix((text, transformed)))
+                violations.append(make_violation(transform.name, count, text, offset))
+                text = transformed
+        return violations
+
+    run_ends = list(itertools.accumulate(len(text) for text in run_texts))
+    unbolded = []
+    for start, end in number_spans:
+        index = bisect.bisect_right(run_ends, start)
+        run_start = run_ends[index - 1] if index else 0
+        while run_start < end:
+            if run_texts[index] and run_element_bold(runs[index]) is not True:
+                unbolded.append(start)
+                break
+            run_start = run_ends[index]
+            index += 1
+    if unbolded:
+        violations.append(make_violation(plan.spans_rule.name, len(unbolded), full_text, unbolded[0]))
+    return violations
+
+
+def check_document(source, fail_fast=False, plan=DEFAULT_PLAN):
+    """
+    Проверяет документ без изменения по правилам плана. source — путь или двоичный поток.
+    Возвращает список нарушений: номер параграфа (с 1, в порядке обработки), признак таблицы,
+    правило, число замен, позиция и фрагмент текста. При fail_fast — не более одного нарушения.
+    """
+    with zipfile.ZipFile(source) as archive:
+        document_name = related_part_name(archive, '', RT.OFFICE_DOCUMENT)
+        if document_name is None:
+            raise DocumentFormattingError("В пакете нет основного документа")
+        with archive.open(document_name) as document_xml:
+            root = etree.parse(document_xml, etree.XMLParser(resolve_entities=False)).getroot()
+    violations = []
+    paragraphs = collect_paragraph_elements(root.find(BODY_TAG))
+    for index, (p, in_table) in enumerate(paragraphs, 1):
+        for violation in paragraph_violations(p, plan):
+            violations.append({'paragraph': index, 'in_table': in_table, **violation})
+            if fail_fast:
+                return violations
+    return violations
+
+
+def check_document_file(doc_path, fail_fast=False, plan=DEFAULT_PLAN):
+    """
+    Проверяет файл и возвращает результат для отчёта: путь, признак соответствия,
+    нарушения и сообщение об ошибке (None, если файл удалось прочитать)
+    """
+    try:
+        violations = check_document(doc_path, fail_fast, plan)
+    except Exception as e:
+        return {'path': doc_path, 'compliant': False, 'violations': [], 'error': str(e)}
+    return {'path': doc_path, 'compliant': not violations, 'violations': violations, 'error': None}
+
+
+def print_check_result(result):
+    if result['error']:
+        echo(f"❌ {result['path']}: не удалось проверить: {result['error']}")
+        return
+    if result['compliant']:
+        echo(f"✅ {result['path']}: нарушений нет")
+        return
+    echo(f"⚠️ {result['path']}: нарушений {len(result['violations'])}")
+    for violation in result['violations']:
+        where = " (таблица)" if violation['in_table'] else ""
+        description = CHECK_RULE_DESCRIPTIONS.get(violation['rule'], violation['rule'])
+        echo(f"   Параграф {violation['paragraph']}{where}: {description} ({violation['count']}) "
+              f"— «{violation['excerpt']}»")
+
+
+def run_check(paths, fail_fast=False, report_format='text', plan=DEFAULT_PLAN):
+    """
+    Режим --check: проверяет файлы по очереди, печатает отчёт и возвращает код завершения:
+    0 — нарушений нет, 1 — найдены нарушения, 2 — файлы не найдены или не прочитаны
+    """
+    files = collect_docx_files(paths, skip_formatted=False)
+    results = []
+    for file_path in files:
+        result = check_document_file(file_path, fail_fast, plan)
+        results.append(result)
+        if report_format == 'text':
+            print_check_result(result)
+        if fail_fast and not result['compliant']:
+            break
+    if report_format == 'json':
+        echo(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        failed = sum(1 for result in results if not result['compliant'])
+        echo(f"Проверено файлов: {len(results)}, не соответствуют: {failed}")
+    if not files or any(result['error'] for result in results):
+        return 2
+    return 0 if all(result['compliant'] for result in results) else 1
+
+
+def document_cache_key(data, options):
+    """
+    Ключ кэша: SHA-256 содержимого документа, версии набора правил и параметров обработки
+    """
+    digest = hashlib.sha256(data)
+    digest.update(f"\0{FORMAT_VERSION}\0{RULES.version}\0".encode('utf-8'))
+    relevant = {key: value for key, value in options.items() if key not in CACHE_NEUTRAL_OPTIONS}
+    digest.update(json.dumps(relevant, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def cache_lookup(cache_dir, key):
+    """
+    Возвращает путь к закэшированному результату или None.
+    При попадании обновляет время изменения файла — по нему работает вытеснение LRU.
+    """
+    cached_path = os.path.join(cache_dir, f"{key}.docx")
+    try:
+        os.utime(cached_path)
+    except OSError:
+        return None
+    return cached_path
+
+
+def cache_store(cache_dir, key, output_path, max_bytes):
+    """
+    Сохраняет результат в кэш и вытесняет давно не использованные записи сверх предельного размера
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    # Запись через временный файл: кэш может использоваться несколькими процессами одновременно
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file, open(output_path, 'rb') as src:
+            shutil.copyfileobj(src, tmp_file)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, os.path.join(cache_dir, f"{key}.docx"))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    evict_cache(cache_dir, max_bytes)
+
+
+def evict_cache(cache_dir, max_bytes):
+    """
+    Удаляет самые давно использованные записи, пока размер кэша превышает max_bytes
+    """
+    entries = []
+    total = 0
+    for entry in os.scandir(cache_dir):
+        if not entry.name.endswith('.docx'):
+            continue
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total += stat.st_size
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+class DocumentFormattingError(Exception):
+    """
+    Документ не удалось обработать: один из этапов завершился с ошибкой
+    """
+
+
+@contextlib.contextmanager
+def collect_stats(options, **document):
+    """
+    Замер обработки одного документа: сбрасывает STATS, измеряет общее время
+    и передаёт отчёт в options['stats_callback'], если он задан
+    """
+    configure_paragraph_cache(options['paragraph_cache_size'])
+    STATS.reset()
+    STATS.document.update(cache_hit=False, success=False, paragraph_cache_hits=0, paragraph_cache_misses=0,
+                          **document)
+    try:
+        with STATS.timed('total_time'):
+            yield STATS.document
+    finally:
+        if options['stats_callback'] is not None:
+            options['stats_callback'](STATS.report())
+
+
+def set_document_margins(doc_path, options=None, output_path=None):
+    """
+    Основная функция обработки документа. Замеры обработки собираются в STATS
+    и передаются в options['stats_callback'], если он задан.
+    output_path — путь результата, по умолчанию имя исходного файла с суффиксом _formatted.
+    """
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    with collect_stats(options, path=doc_path) as record:
+        record['success'] = format_document_file(doc_path, options, output_path)
+    return record['success']
+
+
+def format_document_bytes(document, options=None, quiet=False):
+    """
+    Обрабатывает документ в памяти, без временных файлов.
+    document — содержимое .docx (bytes) или двоичный поток, открытый на чтение.
+    Возвращает содержимое обработанного документа (bytes) и отчёт с замерами обработки.
+    Кэш результатов (cache_dir) в этом режиме не используется.
+    quiet — не выводить сообщения о ходе обработки.
+    При ошибке возбуждается DocumentFormattingError.
+    Функцию можно вызывать одновременно из нескольких потоков: замеры, счётчики замен
+    и сообщения у каждого потока свои. Общий только кэш параграфов, поэтому его попадания
+    в отчёте могут включать обращения других потоков.
+    """
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    if not isinstance(document, (bytes, bytearray, memoryview)):
+        document = document.read()
+    source = io.BytesIO(document)
+    output = io.BytesIO()
+    with captured_output(io.StringIO() if quiet else OUTPUT.stream), collect_stats(options, path=None) as record:
+        try:
+            record['success'] = format_document(source, output, options)
+        except Exception as e:
+            raise DocumentFormattingError(f"Не удалось обработать документ: {e}") from e
+    if not record['success']:
+        raise DocumentFormattingError("Обработка документа завершилась с ошибками")
+    return output.getvalue(), STATS.report()
+
+
+def format_document(source, output, options):
+    """
+    Загружает документ из source, выполняет все этапы обработки и сохраняет результат в output.
+    source и output — пути или двоичные потоки. Возвращает False, если этап завершился с ошибкой.
+    Этапы и их параметры задаёт план, скомпилированный из options['profile'].
+    Несовместимые параметры (см. options_error) — ошибка, документ не обрабатывается.
+    """
+    error = options_error(options)
+    if error:
+        echo(f"❌ {error}")
+        return False
+    plan = compile_profile(options['profile'])
+    if options['pipeline'] == 'staged' and options['profile'] is not None:
+        # Раздельные этапы всегда выполняют профиль по умолчанию
+        echo("⚠️ Профиль правил выполняется однопроходной обработкой")
+        options = {**options, 'pipeline': 'fused'}
+    if options['engine'] == 'stream' and options['pipeline'] != 'staged':
+        if format_document_stream(source, output, options, plan):
+            return True
+        echo("⚠️ Документ нельзя обработать потоково, он загружается целиком")
+        options = {**options, 'engine': 'lxml'}
+        if hasattr(source, 'seek'):
+            source.seek(0)
+    with STATS.timed('load_time'):
+        doc = Document(source)
+    if plan.margins:
+        with STATS.stage('set_margins'):
+            for i, section in enumerate(doc.sections):
+                echo(f"Обрабатываем секцию {i + 1}")
+                for side, value in plan.margins:
+                    setattr(section, f'{side}_margin', value)
+
+    # Список параграфов собирается один раз и используется всеми этапами
+    edits, formatting, coalesce = options['edits'], options['formatting'], options['coalesce_runs']
+    workers = options['analysis_workers']
+    if not plan.formats_paragraphs:
+        echo("ℹ️ Профиль не меняет ни текст, ни оформление параграфов — они не обрабатываются")
+    elif options['pipeline'] == 'staged':
+        if not process_document_staged(doc, collect_document_paragraphs(doc), edits, formatting, coalesce):
+            return False
+    elif options['engine'] == 'lxml':
+        if not process_document_lxml(doc, collect_paragraph_elements(doc.element.body),
+                                     edits, formatting, coalesce, workers, plan):
+            return False
+    elif not process_document_pipeline(doc, collect_document_paragraphs(doc), edits, formatting, coalesce, workers,
+                                       plan):
+        return False
+
+    # В режиме 'styles' кроме document.xml меняется и styles.xml
+    modified_parts = (doc.part, doc.part._styles_part) if plan.modifies_styles(formatting) else None
+    with STATS.timed('save_time'):
+        save_document(doc, source, output, options, modified_parts)
+    return True
+
+
+def formatted_output_path(doc_path, output_dir=None):
+    """
+    Путь результата: имя исходного файла с суффиксом _formatted
+    """
+    name, ext = os.path.splitext(doc_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        name = os.path.join(output_dir, os.path.basename(name))
+    return f"{name}_formatted{ext}"
+
+
+def format_document_file(doc_path, options, output_path=None):
+    """
+    Обрабатывает файл на диске. Если output_path не задан, результат сохраняется
+    с суффиксом _formatted рядом с исходным файлом или в options['output_dir'].
+    """
+    try:
+        if not os.path.exists(doc_path):
+            echo(f"❌ Файл не найден: {doc_path}")
+            return False
+        if output_path is None:
+            output_path = formatted_output_path(doc_path, options['output_dir'])
+
+        cache_key = None
+        source = doc_path
+        if options['cache_dir']:
+            with open(doc_path, 'rb') as f:
+                data = f.read()
+            cache_key = document_cache_key(data, options)
+            cached_path = cache_lookup(options['cache_dir'], cache_key)
+            if cached_path:
+                try:
+                    shutil.copyfile(cached_path, output_path)
+                except OSError:
+                    # Запись вытеснена другим процессом после cache_lookup — обычная обработка
+                    cached_path = None
+            if cached_path:
+                STATS.document['cache_hit'] = True
+                echo(f"✅ Документ не изменился, результат взят из кэша: {output_path}")
+                return True
+            source = io.BytesIO(data)
+        if not format_document(source, output_path, options):
+            return False
+        if cache_key:
+            cache_store(options['cache_dir'], cache_key, output_path, options['cache_max_bytes'])
+        echo(f"✅ Успешно! Документ сохранён как: {output_path}")
+        return True
+    except Exception as e:
+        echo(f"❌ Ошибка: {e}")
+        return False
+
+
+def collect_docx_files(paths, skip_formatted=True):
+    """
+    Раскрывает каталоги и маски в список .docx файлов.
+    Временные файлы Word (~$*) пропускаются, уже отформатированные (*_formatted.docx) —
+    если skip_formatted.
+    """
+    files = []
+    seen = set()
+    for path in paths:
+        if os.path.isdir(path):
+            candidates = glob.glob(os.path.join(path, '*.docx'))
+        elif glob.has_magic(path):
+            candidates = glob.glob(path, recursive=True)
+        else:
+            candidates = [path]
+        for file_path in sorted(candidates):
+            name = os.path.basename(file_path)
+            if not name.lower().endswith('.docx') or name.startswith('~$'):
+                continue
+            if skip_formatted and os.path.splitext(name)[0].endswith('_formatted'):
+                continue
+            key = os.path.abspath(file_path)
+            if key not in seen:
+                seen.add(key)
+                files.append(file_path)
+    return files
+
+
+def format_file_quietly(doc_path, options=None):
+    """
+    Обрабатывает один файл в рабочем процессе пакетного режима.
+    Вывод этапов собирается в строку, чтобы сообщения разных файлов не перемешивались.
+    Параграфы разбираются последовательно: ядра уже заняты другими файлами.
+    Возвращает путь, признак успеха, вывод и отчёт с замерами обработки.
+    """
+    log = io.StringIO()
+    reports = []
+    options = {**(options or {}), 'stats_callback': reports.append, 'analysis_workers': 0}
+    with captured_output(log):
+        try:
+            success = set_document_margins(doc_path, options)
+        except Exception as e:
+            echo(f"❌ Ошибка: {e}")
+            success = False
+    return doc_path, success, log.getvalue(), reports[0] if reports else None
+
+
+def process_batch(files, workers=None, options=None):
+    """
+    Обрабатывает файлы параллельно в пуле процессов.
+    Возвращает списки успешно обработанных файлов и файлов с ошибками (путь, последнее сообщение).
+    Отчёты с замерами передаются в options['stats_callback'] в основном процессе.
+    """
+    options = dict(options or {})
+    stats_callback = options.pop('stats_callback', None)
+    succeeded = []
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(format_file_quietly, file_path, options): file_path for file_path in files}
+        for future in as_completed(futures):
+            file_path = futures[future]
+            try:
+                _, success, log, report = future.result()
+            except Exception as e:
+                success, log, report = False, f"❌ Ошибка рабочего процесса: {e}", None
+            if stats_callback is not None and report is not None:
+                stats_callback(report)
+            if success:
+                succeeded.append(file_path)
+                echo(f"✅ {file_path}")
+            else:
+                lines = [line for line in log.splitlines() if line.strip()]
+                message = lines[-1] if lines else "❌ Неизвестная ошибка"
+                failed.append((file_path, message))
+                echo(f"❌ {file_path}")
+    return succeeded, failed
+
+
+def print_batch_summary(succeeded, failed):
+    echo("-" * 65)
+    echo("=== Итоги пакетной обработки ===")
+    echo(f"✅ Успешно: {len(succeeded)}")
+    echo(f"❌ С ошибками: {len(failed)}")
+    for file_path, message in sorted(failed):
+        echo(f"   {file_path}: {message}")
+
+
+# ---------------------------------------------------------------------------
+# Наблюдение за каталогами: новые и изменённые документы обрабатываются автоматически.
+# Каталоги опрашиваются по времени изменения файлов, без зависимостей от событий ОС.
+
+def ignore_interrupts():
+    """
+    Инициализатор рабочих процессов долгоживущих режимов: Ctrl+C получает только
+    основной процесс, который сам останавливает пул. Обработчик SIGTERM основного
+    процесса рабочим не наследуется
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def interrupt_on_sigterm(signum, frame):
+    """
+    Обработчик SIGTERM: останавливает наблюдение так же, как Ctrl+C
+    """
+    raise KeyboardInterrupt
+
+
+def file_signature(path):
+    """
+    Признак версии файла: время изменения и размер. None, если файл уже удалён.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def load_watch_state(state_path):
+    """
+    Загружает состояние наблюдения: путь файла -> признак успешно обработанной версии и результат
+    """
+    try:
+        with open(state_path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        echo(f"⚠️ Не удалось прочитать файл состояния, документы будут обработаны заново: {e}")
+        return {}
+
+
+def save_watch_state(state_path, state):
+    """
+    Атомарно сохраняет состояние наблюдения (через временный файл и переименование)
+    """
+    directory = os.path.dirname(os.path.abspath(state_path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, state_path)
+    except OSError:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+def watch_directories(directories, options=None, workers=None, poll_interval=2.0, settle_time=2.0,
+                      state_path=None):
+    """
+    Наблюдает за каталогами и обрабатывает новые и изменённые .docx файлы в пуле процессов.
+    Файл берётся в работу, когда его время изменения и размер не менялись settle_time секунд
+    (его перестали записывать). Успешно обработанные версии файлов запоминаются в state_path,
+    поэтому после перезапуска повторно обрабатываются только изменившиеся файлы.
+    Файл, обработка которого завершилась ошибкой, снова берётся в работу при следующих проходах.
+    Работает до прерывания (Ctrl+C) или SIGTERM — например, от systemd или docker stop.
+    """
+    options = dict(options or {})
+    options.pop('stats_callback', None)
+    state = load_watch_state(state_path) if state_path else {}
+    # Файлы, которые ещё записываются: путь -> (признак, время последнего изменения признака)
+    settling = {}
+    running = {}
+    echo(f"👀 Наблюдение за каталогами: {', '.join(directories)} (Ctrl+C — остановить)")
+    with ProcessPoolExecutor(max_workers=workers, initializer=ignore_interrupts) as executor:
+        # Обработчик сигнала можно установить только из основного потока
+        previous_sigterm = None
+        if threading.current_thread() is threading.main_thread():
+            previous_sigterm = signal.signal(signal.SIGTERM, interrupt_on_sigterm)
+        try:
+            while True:
+                now = time.monotonic()
+                for file_path in collect_docx_files(directories):
+                    key = os.path.abspath(file_path)
+                    signature = file_signature(file_path)
+                    if signature is None or key in running:
+                        continue
+                    record = state.get(key)
+                    # Файл с ошибкой (в том числе из состояния прежних версий) обрабатывается повторно
+                    if record and record['signature'] == signature and record['success']:
+                        settling.pop(key, None)
+                        continue
+                    pending = settling.get(key)
+                    if pending is None or pending[0] != signature:
+                        settling[key] = (signature, now)
+                    elif now - pending[1] >= settle_time:
+                        del settling[key]
+                        future = executor.submit(format_file_quietly, file_path, options)
+                        running[key] = (future, signature)
+                        echo(f"⏳ {file_path}")
+
+                for key, (future, signature) in list(running.items()):
+                    if not future.done():
+                        continue
+                    del running[key]
+                    try:
+                        file_path, success, log, _ = future.result()
+                    except Exception as e:
+                        file_path, success, log = key, False, f"❌ Ошибка рабочего процесса: {e}"
+                    # Запоминаются только успешные результаты: временная ошибка (файл занят другой
+                    # программой, нет места на диске) не должна исключать файл из обработки
+                    if success:
+                        state[key] = {'signature': signature, 'success': success}
+                        echo(f"✅ {file_path}")
+                    else:
+                        state.pop(key, None)
+                        lines = [line for line in log.splitlines() if line.strip()]
+                        echo(f"❌ {file_path}: {lines[-1] if lines else 'Неизвестная ошибка'}")
+                    if state_path:
+                        save_watch_state(state_path, state)
+                time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            echo("⏹️ Наблюдение остановлено")
+            for future, _ in running.values():
+                future.cancel()
+        finally:
+            if previous_sigterm is not None:
+                signal.signal(signal.SIGTERM, previous_sigterm)
+
+
+# ---------------------------------------------------------------------------
+# HTTP-сервис: документы принимаются POST-запросом и обрабатываются в пуле постоянно
+# запущенных процессов, поэтому импорты и скомпилированные шаблоны загружаются один раз.
+
+# Параметры обработки, которые можно передать в строке запроса, и их допустимые значения
+SERVICE_OPTION_CHOICES = {
+    'pipeline': ('fused', 'staged'),
+    'engine': ('docx', 'lxml', 'stream'),
+    'edits': ('rebuild', 'splice'),
+    'writer': ('zip', 'docx'),
+    'formatting': ('direct', 'styles'),
+}
+DOCX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+SERVICE_CHUNK_SIZE = 64 * 1024
+# Сколько секунд соединение может простаивать при чтении запроса: зависшая загрузка
+# не держит поток и место в очереди бесконечно
+SERVICE_SOCKET_TIMEOUT = 30.0
+
+
+def warm_up_worker():
+    """
+    Пустая задача: запускает рабочий процесс заранее, чтобы первый документ не ждал импорта
+    """
+    return os.getpid()
+
+
+def format_bytes_quietly(data, options):
+    """
+    Обрабатывает документ в рабочем процессе сервиса, вывод этапов подавляется.
+    Параграфы разбираются последовательно: ядра уже заняты другими запросами.
+    Возвращает результат (или None при ошибке), отчёт с замерами и сообщение об ошибке.
+    """
+    log = io.StringIO()
+    with captured_output(log):
+        try:
+            output, report = format_document_bytes(data, {**(options or {}), 'analysis_workers': 0})
+            return output, report, None
+        except DocumentFormattingError as e:
+            lines = [line for line in log.getvalue().splitlines() if line.strip()]
+            message = lines[-1] if lines and e.__cause__ is None else str(e)
+            return None, None, message
+
+
+def parse_service_options(query):
+    """
+    Разбирает параметры обработки из строки запроса.
+    Возвращает словарь параметров и сообщение об ошибке (None, если ошибок нет).
+    """
+    options = {}
+    for key, value in urllib.parse.parse_qsl(query):
+        choices = SERVICE_OPTION_CHOICES.get(key)
+        if choices is None:
+            return None, f"Неизвестный параметр: {key}"
+        if value not in choices:
+            return None, f"Недопустимое значение {key}={value}, допустимо: {', '.join(choices)}"
+        options[key] = value
+    return options, None
+
+
+class FormattingService:
+    """
+    Пул рабочих процессов с ограниченной очередью: одновременно принимается не больше
+    queue_size документов (в обработке и в ожидании), остальные запросы сразу отклоняются.
+    Место занимается до чтения документа (reserve), поэтому ограничена и память под загрузки.
+    Освобождается оно только когда рабочий процесс действительно закончил документ,
+    даже если клиент уже получил ответ о превышении времени.
+    """
+
+    def __init__(self, workers=None, queue_size=16, timeout=60.0, max_upload_bytes=50 * 1024 * 1024,
+                 options=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.max_upload_bytes = max_upload_bytes
+        self.options = options or {}
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=ignore_interrupts)
+        self.slots = threading.BoundedSemaphore(queue_size)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+
+    def warm_up(self):
+        futures = [self.executor.submit(warm_up_worker) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def reserve(self):
+        """
+        Занимает место в очереди. Возвращает False, если очередь заполнена.
+        Занятое место передаётся в submit или освобождается через release_slot.
+        """
+        return self.slots.acquire(blocking=False)
+
+    def release_slot(self):
+        self.slots.release()
+
+    def submit(self, data, options):
+        """
+        Ставит документ в очередь на место, занятое reserve. Возвращает Future.
+        """
+        try:
+            future = self.executor.submit(format_bytes_quietly, data, {**self.options, **options})
+        except Exception:
+            self.release_slot()
+            raise
+        with self.lock:
+            self.in_flight += 1
+        future.add_done_callback(self.release)
+        return future
+
+    def release(self, future):
+        with self.lock:
+            self.in_flight -= 1
+        self.release_slot()
+
+    def status(self):
+        with self.lock:
+            in_flight = self.in_flight
+        return {'status': 'ok', 'workers': self.workers, 'queue_size': self.queue_size, 'in_flight': in_flight}
+
+    def shutdown(self):
+        self.executor.shutdown(cancel_futures=True)
+
+
+class FormattingRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /format — тело запроса содержит .docx, в ответ передаётся обработанный документ,
+    замеры обработки — в заголовке X-Formatting-Stats. Параметры обработки задаются
+    в строке запроса, например /format?engine=lxml&edits=splice.
+    GET /health — состояние сервиса и число документов в очереди.
+    """
+    server_version = 'DocxFormatter/1.0'
+    timeout = SERVICE_SOCKET_TIMEOUT
+
+    def do_GET(self):
+        if urllib.parse.urlsplit(self.path).path != '/health':
+            self.send_json(HTTPStatus.NOT_FOUND, {'error': "Неизвестный адрес"})
+            return
+        self.send_json(HTTPStatus.OK, self.server.service.status())
+
+    def do_POST(self):
+        service = self.server.service
+        url = urllib.parse.urlsplit(self.path)
+        if url.path != '/format':
+            self.send_json(HTTPStatus.NOT_FOUND, {'error': "Неизвестный адрес"})
+            return
+        options, error = parse_service_options(url.query)
+        if not error:
+            error = options_error({**service.options, **options})
+        if error:
+            self.send_json(HTTPStatus.BAD_REQUEST, {'error': error})
+            return
+        length = self.headers.get('Content-Length')
+        if length is None or not length.isdigit():
+            self.send_json(HTTPStatus.LENGTH_REQUIRED, {'error': "Не указан размер документа"})
+            return
+        length = int(length)
+        if length > service.max_upload_bytes:
+            self.send_json(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {'error': "Документ слишком велик"})
+            return
+        # Место в очереди занимается до чтения тела: при заполненной очереди документ не принимается в память
+        if not service.reserve():
+            self.close_connection = True
+            self.send_json(HTTPStatus.TOO_MANY_REQUESTS, {'error': "Очередь заполнена, повторите позже"},
+                           {'Retry-After': '1'})
+            return
+        try:
+            data = self.rfile.read(length)
+        except OSError:
+            # Истёк SERVICE_SOCKET_TIMEOUT или клиент разорвал соединение
+            service.release_slot()
+            raise
+        if len(data) != length:
+            service.release_slot()
+            self.send_json(HTTPStatus.BAD_REQUEST, {'error': "Документ передан не полностью"})
+            return
+
+        future = service.submit(data, options)
+        try:
+            output, report, error = future.result(timeout=service.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            self.send_json(HTTPStatus.GATEWAY_TIMEOUT, {'error': "Превышено время обработки документа"})
+            return
+        except Exception as e:
+            self.send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f"Ошибка рабочего процесса: {e}"})
+            return
+        if output is None:
+            self.send_json(HTTPStatus.UNPROCESSABLE_ENTITY, {'error': error})
+            return
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', DOCX_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(output)))
+        self.send_header('Content-Disposition', 'attachment; filename="formatted.docx"')
+        self.send_header('X-Formatting-Stats', json.dumps(report, separators=(',', ':')))
+        self.end_headers()
+        for offset in range(0, len(output), SERVICE_CHUNK_SIZE):
+            self.wfile.write(output[offset:offset + SERVICE_CHUNK_SIZE])
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve_http(host, port, service):
+    """
+    Запускает HTTP-сервис обработки документов и работает до прерывания (Ctrl+C)
+    """
+    echo("Запускаем рабочие процессы...")
+    service.warm_up()
+    server = ThreadingHTTPServer((host, port), FormattingRequestHandler)
+    server.service = service
+    echo(f"🌐 Сервис запущен: http://{host}:{port}/format "
+          f"(процессов: {service.workers}, очередь: {service.queue_size}, таймаут: {service.timeout} с)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        echo("⏹️ Сервис остановлен")
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+# ---------------------------------------------------------------------------
+# Режим stdio: один постоянно запущенный процесс принимает задания в формате JSON-lines
+# из stdin и пишет результаты в stdout. Вывод этапов обработки уходит в stderr.
+
+# Параметры, которые нельзя передать в задании
+STDIO_EXCLUDED_OPTIONS = {'stats_callback'}
+
+
+def run_stdio_job(job, options):
+    """
+    Выполняет одно задание {"id", "input", "output", "options"} и возвращает строку результата
+    """
+    result = {'id': job.get('id'), 'input': job.get('input'), 'output': job.get('output'), 'success': False}
+    job_options = job.get('options') or {}
+    if not isinstance(result['input'], str):
+        result['error'] = "Не указан путь к документу (input)"
+        return result
+    if not isinstance(job_options, dict):
+        result['error'] = "Параметры обработки (options) должны быть JSON-объектом"
+        return result
+    unknown = sorted(key for key in job_options if key not in DEFAULT_OPTIONS or key in STDIO_EXCLUDED_OPTIONS)
+    if unknown:
+        result['error'] = f"Неизвестные параметры: {', '.join(unknown)}"
+        return result
+    error = options_error({**options, **job_options})
+    if error:
+        result['error'] = error
+        return result
+
+    reports = []
+    log = io.StringIO()
+    with captured_output(log):
+        try:
+            success = set_document_margins(result['input'], {**options, **job_options, 'stats_callback': reports.append},
+                                           result['output'])
+        except Exception as e:
+            echo(f"❌ Ошибка: {e}")
+            success = False
+    sys.stderr.write(log.getvalue())
+    result['success'] = success
+    if not success:
+        lines = [line for line in log.getvalue().splitlines() if line.strip()]
+        result['error'] = lines[-1] if lines else "❌ Неизвестная ошибка"
+    if success and result['output'] is None:
+        result['output'] = formatted_output_path(result['input'], {**options, **job_options}.get('output_dir'))
+    if reports:
+        result['stats'] = reports[0]
+    return result
+
+
+def serve_stdio(options=None, stdin=None, stdout=None):
+    """
+    Читает задания из stdin по одному JSON-объекту в строке и на каждое пишет
+    в stdout строку с результатом и замерами. Работает до конца входного потока.
+    """
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    options = {key: value for key, value in (options or {}).items() if key not in STDIO_EXCLUDED_OPTIONS}
+    for line in stdin:
+        if not line.strip():
+            continue
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict):
+                raise ValueError("задание должно быть JSON-объектом")
+        except ValueError as e:
+            result = {'id': None, 'success': False, 'error': f"Некорректное задание: {e}"}
+        else:
+            result = run_stdio_job(job, options)
+        stdout.write(json.dumps(result, ensure_ascii=False) + '\n')
+        stdout.flush()
+
+
+def write_stats_report(stats_path, report):
+    """
+    Сохраняет отчёт с замерами обработки в JSON-файл
+    """
+    try:
+        with open(stats_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        echo(f"📊 Замеры обработки сохранены: {stats_path}")
+    except OSError as e:
+        echo(f"⚠️ Не удалось сохранить замеры обработки: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Редактор Word документов")
+    parser.add_argument('paths', nargs='*',
+                        help="путь к .docx файлу, каталог или маска (например, reports/*.docx)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="число процессов для пакетной обработки (по умолчанию — число ядер)")
+    parser.add_argument('--staged', action='store_true',
+                        help="выполнять этапы отдельными проходами по документу")
+    parser.add_argument('--engine', choices=['docx', 'lxml', 'stream'], default='docx',
+                        help="движок однопроходной обработки: объекты python-docx, напрямую XML через lxml "
+                             "или потоково, не загружая документ в память целиком")
+    parser.add_argument('--edits', choices=['rebuild', 'splice'], default=DEFAULT_OPTIONS['edits'],
+                        help="как применять изменения текста: собрать параграф заново или "
+                             "точечно править существующие run, сохраняя их оформление")
+    parser.add_argument('--formatting', choices=['direct', 'styles'], default=DEFAULT_OPTIONS['formatting'],
+                        help="как задавать шрифт и размер: в каждом run или один раз через стили документа")
+    parser.add_argument('--no-coalesce-runs', dest='coalesce_runs', action='store_false',
+                        help="не объединять соседние run с одинаковым оформлением")
+    parser.add_argument('--profile', default=None, metavar='FILE',
+                        help="профиль правил в JSON или TOML: какие правила выполнять и в каком порядке, "
+                             "поля, шрифт, интервалы и выравнивание")
+    parser.add_argument('--analysis-workers', type=int, default=DEFAULT_OPTIONS['analysis_workers'],
+                        help="число процессов для разбора текста параграфов одного большого документа "
+                             "(0 — последовательно; в пакетном режиме и сервисах не используется)")
+    parser.add_argument('--cache-dir', default=None,
+                        help="каталог кэша результатов: неизменённые документы не обрабатываются повторно")
+    parser.add_argument('--cache-max-mb', type=int, default=1024,
+                        help="предельный размер кэша в МБ (по умолчанию 1024)")
+    parser.add_argument('--paragraph-cache-size', type=int, default=DEFAULT_OPTIONS['paragraph_cache_size'],
+                        help="число запоминаемых результатов обработки параграфов (0 — без кэша)")
+    parser.add_argument('--writer', choices=['zip', 'docx'], default='zip',
+                        help="способ сохранения: переписать только изменённые части архива или весь документ "
+                             "(с --engine stream доступен только zip)")
+    parser.add_argument('--compress-level', type=int, choices=range(10), default=DEFAULT_OPTIONS['compress_level'],
+                        metavar='0-9', help="уровень сжатия переписываемых частей (по умолчанию 6)")
+    parser.add_argument('--stats', default=None, metavar='FILE',
+                        help="записать в JSON-файл время и счётчики каждого этапа обработки")
+    parser.add_argument('--output-dir', default=None,
+                        help="каталог для обработанных документов (по умолчанию — рядом с исходными)")
+    parser.add_argument('--watch', action='store_true',
+                        help="наблюдать за каталогами из paths и обрабатывать новые и изменённые документы")
+    parser.add_argument('--poll-interval', type=float, default=2.0,
+                        help="период опроса каталогов в режиме наблюдения, в секундах")
+    parser.add_argument('--settle-time', type=float, default=2.0,
+                        help="сколько секунд файл не должен меняться, прежде чем его обработать")
+    parser.add_argument('--state-file', default=None,
+                        help="файл состояния режима наблюдения (по умолчанию .formatter_state.json "
+                             "в каталоге результатов или в первом наблюдаемом каталоге)")
+    parser.add_argument('--check', action='store_true',
+                        help="только проверить документы, не изменяя их; код завершения 1 — есть нарушения")
+    parser.add_argument('--fail-fast', action='store_true',
+                        help="в режиме проверки остановиться на первом нарушении")
+    parser.add_argument('--report-format', choices=['text', 'json'], default='text',
+                        help="формат отчёта режима проверки: текст или JSON-список нарушений")
+    parser.add_argument('--serve-stdio', action='store_true',
+                        help="принимать задания JSON-lines из stdin и писать результаты в stdout")
+    parser.add_argument('--serve-http', type=int, default=None, metavar='PORT',
+                        help="запустить HTTP-сервис обработки документов на указанном порту")
+    parser.add_argument('--host', default='127.0.0.1',
+                        help="адрес HTTP-сервиса (по умолчанию 127.0.0.1)")
+    parser.add_argument('--queue-size', type=int, default=16,
+                        help="сколько документов HTTP-сервис принимает одновременно, остальным отвечает 429")
+    parser.add_argument('--request-timeout', type=float, default=60.0,
+                        help="предельное время обработки документа HTTP-сервисом в секундах")
+    parser.add_argument('--max-upload-mb', type=int, default=50,
+                        help="предельный размер документа, принимаемого HTTP-сервисом, в МБ")
+    args = parser.parse_args()
+    options = {'pipeline': 'staged'} if args.staged else {}
+    options['engine'] = args.engine
+    options['edits'] = args.edits
+    options['formatting'] = args.formatting
+    options['coalesce_runs'] = args.coalesce_runs
+    options['analysis_workers'] = args.analysis_workers
+    options['writer'] = args.writer
+    options['compress_level'] = args.compress_level
+    options['paragraph_cache_size'] = args.paragraph_cache_size
+    error = options_error(options)
+    if error:
+        echo(f"❌ {error}")
+        sys.exit(2)
+    if args.cache_dir:
+        options['cache_dir'] = args.cache_dir
+        options['cache_max_bytes'] = args.cache_max_mb * 1024 * 1024
+    if args.output_dir:
+        options['output_dir'] = args.output_dir
+    if args.profile:
+        try:
+            options['profile'] = load_profile(args.profile)
+        except (OSError, ValueError) as e:
+            echo(f"❌ Не удалось загрузить профиль {args.profile}: {e}")
+            sys.exit(2)
+    plan = compile_profile(options.get('profile'))
+    if args.check:
+        paths = [path.strip('"\'') for path in args.paths]
+        if not paths:
+            echo("❌ Укажите файлы или каталоги для проверки")
+            sys.exit(2)
+        sys.exit(run_check(paths, args.fail_fast, args.report_format, plan))
+
+    if args.serve_stdio:
+        serve_stdio(options)
+        return
+
+    if args.serve_http is not None:
+        service = FormattingService(args.workers, args.queue_size, args.request_timeout,
+                                    args.max_upload_mb * 1024 * 1024, options)
+        serve_http(args.host, args.serve_http, service)
+        return
+
+    if args.watch:
+        directories = [path.strip('"\'') for path in args.paths]
+        missing = [path for path in directories if not os.path.isdir(path)]
+        if not directories or missing:
+            echo(f"❌ Укажите существующие каталоги для наблюдения: {', '.join(missing)}")
+            sys.exit(1)
+        state_path = args.state_file or os.path.join(args.output_dir or directories[0], '.formatter_state.json')
+        watch_directories(directories, options, args.workers, args.poll_interval, args.settle_time, state_path)
+        return
+
+    reports = []
+    if args.stats:
+        options['stats_callback'] = reports.append
+
+    echo("=== Редактор Word документов ===")
+    echo("Выполняемые действия:")
+    for number, step in enumerate(plan.steps(), 1):
+        echo(f"{number}. {step}")
+    echo("-" * 65)
+
+    paths = [path.strip('"\'') for path in args.paths]
+    if not paths:
+        paths = [input("Введите путь к .docx файлу: ").strip().strip('"\'')]
+
+    # Пакетный режим: несколько путей, каталог или маска
+    if len(paths) > 1 or os.path.isdir(paths[0]) or glob.has_magic(paths[0]):
+        files = collect_docx_files(paths)
+        if not files:
+            echo("⚠️ Не найдено ни одного .docx файла")
+            return
+        echo(f"Найдено файлов: {len(files)}")
+        succeeded, failed = process_batch(files, args.workers, options)
+        print_batch_summary(succeeded, failed)
+        if args.stats:
+            write_stats_report(args.stats, sorted(reports, key=lambda report: report['path']))
+        if failed:
+            sys.exit(1)
+        return
+
+    file_path = paths[0]
+    if not file_path.lower().endswith('.docx'):
+        echo("⚠️ Файл должен иметь расширение .docx")
+        return
+
+    success = set_document_margins(file_path, options)
+    if args.stats and reports:
+        write_stats_report(args.stats, reports[0])
+    if not success:
+        echo("❌ Обработка завершена с ошибками")
+    else:
+        echo("🎉 Обработка завершена успешно!")
+
+
+if __name__ == "__main__":
+    main()
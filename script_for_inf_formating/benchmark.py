@@ -0,0 +1,356 @@
+"""
+Замеры производительности редактора документов.
+
+Генерирует синтетические документы заданного размера, замеряет обработку целиком
+(set_document_margins) и каждый этап по отдельности, сохраняет результаты в JSON
+и сравнивает их с базовым файлом.
+
+Примеры:
+    python benchmark.py generate sample.docx --paragraphs 2000 --tables 20
+    python benchmark.py run --output baseline.json
+    python benchmark.py run --output current.json
+    python benchmark.py compare baseline.json current.json --threshold 0.1
+"""
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import contextlib
+
+import docx
+from docx import Document
+from docx.shared import Pt
+
+import app
+
+# Этапы раздельной обработки в порядке выполнения
+STAGES = [
+    ('reset_text_formatting_except_bold', app.reset_text_formatting_except_bold),
+    ('apply_uniform_formatting', app.apply_uniform_formatting),
+    ('process_special_spaces', app.process_special_spaces),
+    ('process_quotes', app.process_quotes),
+    ('normalize_dates', app.normalize_dates),
+    ('format_numbers', app.format_numbers),
+    ('process_stanitsa_abbreviations', app.process_stanitsa_abbreviations),
+    ('make_numbers_bold', app.make_numbers_bold),
+    ('coalesce_runs', app.coalesce_runs),
+    ('set_justify_alignment', app.set_justify_alignment),
+]
+
+# Обработка целиком: (название, параметры set_document_margins)
+PIPELINES = [
+    ('staged', {'pipeline': 'staged'}),
+    ('fused_docx', {'engine': 'docx'}),
+    ('fused_lxml', {'engine': 'lxml'}),
+    ('fused_lxml_styles', {'engine': 'lxml', 'formatting': 'styles'}),
+    ('stream', {'engine': 'stream'}),
+    # Дешёвый профиль: только поля и кавычки, без сброса шрифта, интервалов и выравнивания
+    ('fused_lxml_quotes_profile', {'engine': 'lxml', 'profile': {
+        'rules': ['quotes'], 'font': False, 'spacing': False, 'justify': False}}),
+]
+
+WORDS = [
+    'отчет', 'администрация', 'поселения', 'в', 'на', 'по', 'итого', 'рублей', 'млрд', 'год', 'году',
+    'исполнение', 'контракт', 'работы', 'ст. Бриньковская', 'станицы', '"Проект"', 'согласно', 'плану',
+]
+MONTHS = ['января', 'марта', 'мая', 'июля', 'сентября', 'декабря']
+MONTH_ABBREVIATIONS = ['янв.', 'мар.', 'май.', 'июл.', 'сен.', 'дек.']
+
+DEFAULT_CONFIG = {
+    'paragraphs': 1000,
+    'words': 25,
+    'tables': 10,
+    'rows': 5,
+    'cols': 4,
+    'merged_ratio': 0.2,
+    'number_density': 0.15,
+    'date_density': 0.05,
+    'seed': 1,
+}
+
+
+def random_number(rng):
+    """
+    Число в одном из встречающихся в документах видов: целое, десятичное, процент, номер дела
+    """
+    kind = rng.random()
+    if kind < 0.5:
+        return str(rng.randint(0, 5000000))
+    if kind < 0.7:
+        return f"{rng.randint(0, 99999)}.{rng.randint(0, 99)}"
+    if kind < 0.9:
+        return f"{rng.randint(0, 100)}%"
+    return f"№ А32-{rng.randint(100, 99999)}/{rng.randint(2000, 2030)}"
+
+
+def random_date(rng):
+    """
+    Дата в одном из форматов, которые нормализует normalize_dates_in_text
+    """
+    day, month, year = rng.randint(1, 28), rng.randint(1, 12), rng.randint(1995, 2030)
+    kind = rng.randint(0, 4)
+    if kind == 0:
+        return f"{day:02d}.{month:02d}.{year}"
+    if kind == 1:
+        return f"{year}-{month:02d}-{day:02d}"
+    if kind == 2:
+        return f"{day} {rng.choice(MONTHS)} {year}" + rng.choice(['', ' г.', ' года'])
+    if kind == 3:
+        return f"{day} {rng.choice(MONTH_ABBREVIATIONS)} {year}"
+    return f"{year} г."
+
+
+def random_token(rng, config):
+    value = rng.random()
+    if value < config['number_density']:
+        return random_number(rng)
+    if value < config['number_density'] + config['date_density']:
+        return random_date(rng)
+    return rng.choice(WORDS)
+
+
+def add_random_paragraph(container, rng, config):
+    """
+    Параграф из нескольких run со смешанным оформлением
+    """
+    paragraph = container.add_paragraph()
+    tokens = [random_token(rng, config) for _ in range(rng.randint(1, 2 * config['words']))]
+    pos = 0
+    while pos < len(tokens):
+        size = rng.randint(1, 5)
+        run = paragraph.add_run(' '.join(tokens[pos:pos + size]) + ' ')
+        if rng.random() < 0.2:
+            run.bold = True
+        if rng.random() < 0.1:
+            run.italic = True
+        if rng.random() < 0.1:
+            run.font.size = Pt(11)
+        pos += size
+    return paragraph
+
+
+def add_random_table(doc, rng, config):
+    """
+    Таблица; доля объединённых ячеек задаётся merged_ratio (объединение с соседней справа)
+    """
+    table = doc.add_table(rows=config['rows'], cols=config['cols'])
+    for row in table.rows:
+        for cell in row.cells:
+            cell.paragraphs[0].add_run(f"{random_token(rng, config)} {random_token(rng, config)}")
+    for row_index in range(config['rows']):
+        col_index = 0
+        while col_index < config['cols'] - 1:
+            if rng.random() < config['merged_ratio']:
+                table.cell(row_index, col_index).merge(table.cell(row_index, col_index + 1))
+                col_index += 2
+            else:
+                col_index += 1
+    return table
+
+
+def generate_document(config=None):
+    """
+    Синтетический документ: параграфы с числами и датами заданной плотности и таблицы,
+    равномерно распределённые по тексту
+    """
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    rng = random.Random(config['seed'])
+    doc = Document()
+    table_every = config['paragraphs'] // config['tables'] if config['tables'] else 0
+    tables_added = 0
+    for index in range(config['paragraphs']):
+        add_random_paragraph(doc, rng, config)
+        if table_every and index % table_every == table_every - 1 and tables_added < config['tables']:
+            add_random_table(doc, rng, config)
+            tables_added += 1
+    return doc
+
+
+def time_end_to_end(doc_path, options, repeat):
+    """
+    Лучшее из repeat время обработки документа функцией set_document_margins
+    и счётчики кэша параграфов последнего повтора
+    """
+    timings = []
+    reports = []
+    options = {**options, 'stats_callback': reports.append}
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            success = app.set_document_margins(doc_path, options)
+            elapsed = time.perf_counter() - start
+        if not success:
+            raise RuntimeError(f"Обработка {doc_path} завершилась ошибкой")
+        timings.append(elapsed)
+    paragraph_cache = {'hits': reports[-1]['paragraph_cache_hits'], 'misses': reports[-1]['paragraph_cache_misses']}
+    return min(timings), paragraph_cache
+
+
+def time_stages(doc_path, repeat):
+    """
+    Время каждого этапа раздельной обработки. Этапы выполняются по порядку,
+    каждый получает результат предыдущего — как в process_document_staged.
+    """
+    timings = {name: [] for name, _ in STAGES}
+    for _ in range(repeat):
+        doc = Document(doc_path)
+        paragraphs = app.collect_document_paragraphs(doc)
+        for name, stage in STAGES:
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                success = stage(doc, paragraphs)
+                elapsed = time.perf_counter() - start
+            if not success:
+                raise RuntimeError(f"Этап {name} завершился ошибкой")
+            timings[name].append(elapsed)
+    return {name: min(values) for name, values in timings.items()}
+
+
+def run_benchmark(doc_path, repeat=3):
+    """
+    Все замеры для одного документа: обработка целиком (раздельная и однопроходная)
+    и отдельные этапы. Кэши результатов и параграфов отключены, чтобы замерять обработку.
+    Возвращает время замеров и счётчики кэша параграфов по способам обработки целиком.
+    """
+    base_options = {'cache_dir': None, 'paragraph_cache_size': 0}
+    results = {}
+    paragraph_cache = {}
+    for name, options in PIPELINES:
+        results[f"total.{name}"], paragraph_cache[f"total.{name}"] = time_end_to_end(
+            doc_path, {**base_options, **options}, repeat)
+    for name, elapsed in time_stages(doc_path, repeat).items():
+        results[f"stage.{name}"] = elapsed
+    return results, paragraph_cache
+
+
+def environment_info():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'python_docx': getattr(docx, '__version__', 'unknown'),
+    }
+
+
+def compare_results(baseline, current, threshold):
+    """
+    Сравнивает замеры: возвращает строки отчёта и список замеров, замедлившихся
+    больше чем на threshold (доля, 0.1 — на 10%)
+    """
+    lines = []
+    regressions = []
+    for name, base_value in baseline['results'].items():
+        if name not in current['results']:
+            lines.append(f"  {name:<45} {base_value:9.4f}s {'—':>10}  нет в текущих замерах")
+            continue
+        value = current['results'][name]
+        change = (value - base_value) / base_value if base_value else 0.0
+        mark = ''
+        if change > threshold:
+            mark = '  ⚠️ замедление'
+            regressions.append(name)
+        lines.append(f"  {name:<45} {base_value:9.4f}s {value:9.4f}s {change:+8.1%}{mark}")
+    return lines, regressions
+
+
+def config_from_args(args):
+    return {key: getattr(args, key) for key in DEFAULT_CONFIG}
+
+
+def add_config_arguments(parser):
+    parser.add_argument('--paragraphs', type=int, default=DEFAULT_CONFIG['paragraphs'],
+                        help="число параграфов")
+    parser.add_argument('--words', type=int, default=DEFAULT_CONFIG['words'],
+                        help="среднее число слов в параграфе")
+    parser.add_argument('--tables', type=int, default=DEFAULT_CONFIG['tables'],
+                        help="число таблиц")
+    parser.add_argument('--rows', type=int, default=DEFAULT_CONFIG['rows'],
+                        help="строк в таблице")
+    parser.add_argument('--cols', type=int, default=DEFAULT_CONFIG['cols'],
+                        help="столбцов в таблице")
+    parser.add_argument('--merged-ratio', type=float, default=DEFAULT_CONFIG['merged_ratio'],
+                        help="доля объединённых ячеек таблиц (0–1)")
+    parser.add_argument('--number-density', type=float, default=DEFAULT_CONFIG['number_density'],
+                        help="доля слов-чисел (0–1)")
+    parser.add_argument('--date-density', type=float, default=DEFAULT_CONFIG['date_density'],
+                        help="доля дат среди слов (0–1)")
+    parser.add_argument('--seed', type=int, default=DEFAULT_CONFIG['seed'],
+                        help="начальное значение генератора случайных чисел")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры производительности редактора документов")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help="создать синтетический документ")
+    generate.add_argument('output', help="путь к создаваемому .docx")
+    add_config_arguments(generate)
+
+    run = commands.add_parser('run', help="выполнить замеры и сохранить их в JSON")
+    run.add_argument('--document', default=None,
+                     help="замерять готовый .docx вместо синтетического")
+    run.add_argument('--repeat', type=int, default=3, help="число повторов, берётся лучшее время")
+    run.add_argument('--output', default='benchmark.json', help="файл результатов")
+    add_config_arguments(run)
+
+    compare = commands.add_parser('compare', help="сравнить результаты с базовыми")
+    compare.add_argument('baseline', help="базовый файл результатов")
+    compare.add_argument('current', help="текущий файл результатов")
+    compare.add_argument('--threshold', type=float, default=0.1,
+                         help="допустимое замедление (доля, по умолчанию 0.1 — 10%%)")
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        generate_document(config_from_args(args)).save(args.output)
+        print(f"✅ Документ создан: {args.output}")
+        return
+
+    if args.command == 'run':
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            if args.document:
+                doc_path = os.path.join(tmp_dir, os.path.basename(args.document))
+                with open(args.document, 'rb') as src, open(doc_path, 'wb') as dst:
+                    dst.write(src.read())
+                config = {'document': os.path.basename(args.document)}
+            else:
+                config = config_from_args(args)
+                doc_path = os.path.join(tmp_dir, 'benchmark.docx')
+                generate_document(config).save(doc_path)
+            print("Выполняются замеры...")
+            results, paragraph_cache = run_benchmark(doc_path, args.repeat)
+        report = {
+            'config': config,
+            'repeat': args.repeat,
+            'environment': environment_info(),
+            'results': results,
+            'paragraph_cache': paragraph_cache,
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        for name, value in results.items():
+            print(f"  {name:<45} {value:9.4f}s")
+        print(f"✅ Результаты сохранены: {args.output}")
+        return
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.current, encoding='utf-8') as f:
+        current = json.load(f)
+    if baseline.get('config') != current.get('config'):
+        print("⚠️ Замеры выполнены на разных документах, сравнение может быть некорректным")
+    lines, regressions = compare_results(baseline, current, args.threshold)
+    print(f"  {'замер':<45} {'базовый':>10} {'текущий':>10} {'изменение':>9}")
+    for line in lines:
+        print(line)
+    if regressions:
+        print(f"❌ Замедление больше {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+    print("✅ Замедлений сверх порога нет")
+
+
+if __name__ == "__main__":
+    main()